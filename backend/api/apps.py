@@ -5,3 +5,15 @@ class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
     verbose_name = "API"
+
+    def ready(self):
+        from django.conf import settings
+        from django.core.signals import request_started
+        from foodgram.db_routers import check_connections
+
+        from . import signals  # noqa: F401
+        from .exporters import register_fonts
+
+        register_fonts()
+        if settings.CONN_HEALTH_CHECKS:
+            request_started.connect(check_connections)
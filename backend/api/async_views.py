@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import wraps
+from tempfile import SpooledTemporaryFile
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import FileResponse
+from foodgram.db_routers import check_connections
+from rest_framework.permissions import SAFE_METHODS
+
+from .queries import record_queries
+
+SPOOL_MAX_SIZE = 1024 * 1024
+
+read_executor = ThreadPoolExecutor(
+    max_workers=settings.ASGI_READ_THREADS, thread_name_prefix="api-read"
+)
+
+
+def spooled(response):
+    """Ответ, который можно отдавать из цикла событий.
+
+    Генератор StreamingHttpResponse обращается к базе, а под ASGI Django
+    перебирает его в цикле событий, где ORM недоступна. Поэтому тело
+    пишется заранее, в потоке view, во временный файл: до SPOOL_MAX_SIZE
+    в памяти, дальше на диске, и отдаётся как FileResponse. FileResponse
+    читает уже готовый файл и остаётся как есть.
+    """
+    if not response.streaming or isinstance(response, FileResponse):
+        return response
+    file = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        for chunk in response.streaming_content:
+            file.write(chunk)
+    except BaseException:
+        file.close()
+        raise
+    finally:
+        response.close()
+    file.seek(0)
+    spooled_response = FileResponse(file, status=response.status_code)
+    for header, value in response.items():
+        spooled_response[header] = value
+    return spooled_response
+
+
+def run_view(view, request, *args, **kwargs):
+    recorder = getattr(request, "query_recorder", None)
+    if settings.CONN_HEALTH_CHECKS:
+        check_connections()
+    try:
+        with record_queries(recorder) if recorder else nullcontext():
+            response = view(request, *args, **kwargs)
+            if callable(getattr(response, "render", None)):
+                response = response.render()
+            return spooled(response)
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """Асинхронная обёртка view для режима ASGI.
+
+    Django 3.2 выполняет синхронные view под ASGI в одном общем потоке,
+    поэтому запросы процесса обрабатываются по очереди. Читающие запросы
+    (GET, HEAD, OPTIONS) выполняются в пуле из ASGI_READ_THREADS потоков
+    со своими соединениями с базой, изменяющие — как обычно, в общем
+    потоке. Медленные клиенты обслуживает цикл событий сервера, не занимая
+    ни поток, ни процесс.
+    """
+    read = sync_to_async(
+        run_view, thread_sensitive=False, executor=read_executor
+    )
+    write = sync_to_async(run_view)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        handler = read if request.method in SAFE_METHODS else write
+        return await handler(view, request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_patterns(patterns):
+    """В режиме ASGI заменяет view в URL-шаблонах асинхронными."""
+    if settings.SERVER_MODE == "asgi":
+        for pattern in patterns:
+            pattern.callback = async_view(pattern.callback)
+    return patterns
@@ -0,0 +1,123 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+from .cache import bump_generation, get_generation
+
+TOKEN_KEY = "api:token:{}"
+TOKEN_GENERATION = "api.token.{}"
+
+
+def token_digest(key):
+    return sha256(key.encode()).hexdigest()
+
+
+def token_generation(key):
+    return TOKEN_GENERATION.format(token_digest(key))
+
+
+class LocalTokenCache:
+    """LRU-кэш токенов в памяти процесса с временем жизни записей."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, token = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return token
+
+    def set(self, key, token):
+        with self.lock:
+            self.entries[key] = (
+                time.monotonic() + settings.TOKEN_CACHE_TIMEOUT, token
+            )
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.TOKEN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+class SharedTokenCache:
+    """Токены в кэше Django: удаление записи видят все процессы."""
+
+    @staticmethod
+    def cache_key(key):
+        return TOKEN_KEY.format(token_digest(key))
+
+    def get(self, key):
+        return cache.get(self.cache_key(key))
+
+    def set(self, key, token):
+        cache.set(self.cache_key(key), token, settings.TOKEN_CACHE_TIMEOUT)
+
+    def delete(self, key):
+        cache.delete(self.cache_key(key))
+
+
+local_token_cache = LocalTokenCache()
+shared_token_cache = SharedTokenCache()
+
+
+def token_cache():
+    if settings.TOKEN_CACHE_SHARED:
+        return shared_token_cache
+    return local_token_cache
+
+
+def forget_tokens(*keys):
+    """Сбрасывает закэшированные токены: выход, смена пароля, блокировка.
+
+    Сдвиг поколения токена видят все процессы, у которых общий кэш Django.
+    """
+    for key in keys:
+        local_token_cache.delete(key)
+        shared_token_cache.delete(key)
+        bump_generation(token_generation(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе для уже проверенных токенов.
+
+    Токен вместе с пользователем хранится TOKEN_CACHE_TIMEOUT секунд в
+    памяти процесса (не больше TOKEN_CACHE_SIZE записей) или, с
+    TOKEN_CACHE_SHARED, в кэше Django. Запись годна, пока не сдвинулось
+    поколение токена в кэше Django: его сдвигают удаление токена и любое
+    сохранение пользователя, кроме last_login. Поэтому выход, смена пароля
+    и блокировка видны сразу во всех процессах, а пользователь в запросе
+    не старше последнего сохранения. Запрос получает копии объектов,
+    чтобы изменения в одном запросе не попадали в другие. Без TOKEN_CACHE
+    токен проверяется по базе в каждом запросе.
+    """
+
+    def authenticate_credentials(self, key):
+        if not settings.TOKEN_CACHE:
+            return super().authenticate_credentials(key)
+        # Поколение читается до базы: изменение, зафиксированное позже,
+        # сдвинет его, и запись станет устаревшей.
+        generation = get_generation(token_generation(key))
+        cached = token_cache().get(key)
+        if cached is None or cached[0] != generation:
+            user, token = super().authenticate_credentials(key)
+            cached = (generation, token)
+            token_cache().set(key, cached)
+        token = copy.copy(cached[1])
+        token.user = copy.copy(cached[1].user)
+        return token.user, token
@@ -0,0 +1,75 @@
+import time
+from hashlib import md5
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import urlencode
+
+GENERATION_KEY = "api:generation:{}"
+RESPONSE_KEY = "api:response:{}"
+
+
+def generation_name(model):
+    return model._meta.label_lower
+
+
+def counter_generation_name(model, field):
+    """Поколение денормализованного счётчика, по которому сортируют."""
+    return f"{generation_name(model)}.{field}"
+
+
+def get_generations(*names):
+    """Текущие поколения данных по именам, одним запросом к кэшу."""
+    keys = [GENERATION_KEY.format(name) for name in names]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # Начальное значение берётся из времени, чтобы после вытеснения
+            # ключа из кэша не вернуться к уже использованному поколению.
+            cache.add(key, time.time_ns(), timeout=None)
+            generations[key] = cache.get(key)
+    return tuple(generations[key] for key in keys)
+
+
+def get_generation(name):
+    return get_generations(name)[0]
+
+
+def bump_generation(name):
+    """Сдвигает поколение, делая устаревшими все ключи на его основе."""
+    key = GENERATION_KEY.format(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+        return cache.incr(key)
+
+
+def bump_generation_on_commit(name):
+    """Сдвиг поколения после фиксации транзакции.
+
+    Если сдвинуть раньше, параллельный запрос успеет прочитать ещё старые
+    строки и сохранить их в кэше под новым поколением.
+    """
+    transaction.on_commit(lambda: bump_generation(name))
+
+
+def normalize_query(query_params):
+    return urlencode(sorted(
+        (name, sorted(value for value in values if value))
+        for name, values in query_params.lists()
+        if any(values)
+    ), doseq=True)
+
+
+def response_digest(request, names):
+    """Хэш запроса вместе с поколениями данных, из которых строится ответ."""
+    generations = get_generations(*names)
+    raw_key = ":".join((
+        ",".join(map(str, generations)),
+        request.accepted_renderer.format,
+        request.get_host(),
+        request.path,
+        normalize_query(request.query_params),
+    ))
+    return md5(raw_key.encode()).hexdigest()
@@ -0,0 +1,108 @@
+import threading
+from collections import defaultdict, namedtuple
+
+from django.db import DEFAULT_DB_ALIAS
+from recipes.models import Ingredient, Recipe, Tag
+
+from .cache import generation_name, get_generation
+
+Snapshot = namedtuple("Snapshot", "rows by_id positions")
+
+
+class CatalogTable:
+    """Справочная модель целиком в памяти процесса.
+
+    Строки хранятся кортежами в порядке модели и загружаются при первом
+    обращении. Об изменениях в других процессах таблица узнаёт по
+    поколению модели в кэше Django, которое сдвигают сигналы post_save и
+    post_delete, и тогда перечитывает строки.
+    """
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+        self.lock = threading.Lock()
+        self.generation = None
+        self.snapshot = Snapshot((), {}, {})
+
+    def __deepcopy__(self, memo):
+        # Таблица одна на процесс, поля сериализаторов копируют ссылку.
+        return self
+
+    def load(self):
+        # Снимок живёт до следующего поколения, реплика могла бы отстать.
+        rows = tuple(self.model.objects.using(DEFAULT_DB_ALIAS).values_list(
+            *self.fields
+        ))
+        return Snapshot(
+            rows,
+            {row[0]: row for row in rows},
+            {row[0]: position for position, row in enumerate(rows)},
+        )
+
+    def refresh(self):
+        generation = get_generation(generation_name(self.model))
+        if generation == self.generation:
+            return self.snapshot
+        with self.lock:
+            if generation != self.generation:
+                self.snapshot = self.load()
+                self.generation = generation
+        return self.snapshot
+
+    def get(self, pk, snapshot=None):
+        """Строка по id; объекта, которого ещё нет в снимке, ищет в базе."""
+        snapshot = snapshot or self.refresh()
+        row = snapshot.by_id.get(pk)
+        if row is None:
+            row = self.model.objects.filter(pk=pk).values_list(
+                *self.fields
+            ).first()
+        return row
+
+    def ordered(self, pks, snapshot=None):
+        """Строки по списку id в порядке модели, отсутствующие пропускаются."""
+        snapshot = snapshot or self.refresh()
+        rows = filter(None, (self.get(pk, snapshot) for pk in pks))
+        return sorted(
+            rows,
+            key=lambda row: snapshot.positions.get(row[0], len(snapshot.rows)),
+        )
+
+    def values_list(self, *fields):
+        indexes = [self.fields.index(field) for field in fields]
+        return [
+            tuple(row[index] for index in indexes)
+            for row in self.refresh().rows
+        ]
+
+    def as_dict(self, row):
+        return dict(zip(self.fields, row))
+
+    def as_dicts(self):
+        return [self.as_dict(row) for row in self.refresh().rows]
+
+
+tag_catalog = CatalogTable(Tag, ("id", "name", "color", "slug"))
+ingredient_catalog = CatalogTable(
+    Ingredient, ("id", "name", "measurement_unit")
+)
+
+
+def context_snapshot(context, table):
+    """Снимок таблицы, общий для всех вложенных сериализаторов запроса."""
+    snapshots = context.setdefault("catalog", {})
+    if table.model not in snapshots:
+        snapshots[table.model] = table.refresh()
+    return snapshots[table.model]
+
+
+def attach_tag_ids(recipes):
+    """Проставляет рецептам tag_ids одним запросом к таблице связей."""
+    tag_ids = defaultdict(list)
+    for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+        recipe_id__in={recipe.pk for recipe in recipes}
+    ).values_list("recipe_id", "tag_id"):
+        tag_ids[recipe_id].append(tag_id)
+    for recipe in recipes:
+        recipe.tag_ids = tag_ids[recipe.pk]
@@ -0,0 +1,152 @@
+import csv
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.db.models import F
+from django.http import FileResponse, StreamingHttpResponse
+from recipes.models import ShoppingCartIngredient
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+FONT = "DejaVuSans"
+FONT_BOLD = "DejaVuSans-Bold"
+TITLE = "Список покупок:"
+CHUNK_SIZE = 500
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+def register_fonts():
+    """Регистрация шрифтов с кириллицей для PDF, один раз на процесс."""
+    for name in (FONT, FONT_BOLD):
+        pdfmetrics.registerFont(
+            TTFont(name, os.path.join(settings.FONTS_DIR, f"{name}.ttf"))
+        )
+
+
+def shopping_cart_ingredients(user):
+    """Ингредиенты из списка покупок по готовому агрегату."""
+    return (
+        ShoppingCartIngredient.objects.filter(user=user)
+        .values(
+            "ingredient__name",
+            "ingredient__measurement_unit",
+            sum_total=F("total_amount"),
+        )
+        .order_by("ingredient__name", "ingredient__measurement_unit")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def format_line(index, ingredient):
+    return (
+        f"{index}. "
+        f'{ingredient["ingredient__name"]} '
+        f'{ingredient["sum_total"]} '
+        f'{ingredient["ingredient__measurement_unit"]}.'
+    )
+
+
+class Echo:
+    """Псевдофайл для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingCartExporter:
+    extension = None
+    content_type = None
+
+    def __init__(self, ingredients):
+        self.ingredients = ingredients
+
+    def get_filename(self, name):
+        return f"{name}.{self.extension}"
+
+    def lines(self):
+        raise NotImplementedError
+
+    def response(self, name):
+        response = StreamingHttpResponse(
+            self.lines(), content_type=self.content_type
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="{self.get_filename(name)}"'
+        )
+        return response
+
+
+class TXTExporter(ShoppingCartExporter):
+    extension = "txt"
+    content_type = "text/plain; charset=utf-8"
+
+    def lines(self):
+        yield f"{TITLE}\n"
+        for index, ingredient in enumerate(self.ingredients, start=1):
+            yield format_line(index, ingredient) + "\n"
+
+
+class CSVExporter(ShoppingCartExporter):
+    extension = "csv"
+    content_type = "text/csv; charset=utf-8"
+
+    def lines(self):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ("Ингредиент", "Количество", "Единица измерения")
+        )
+        for ingredient in self.ingredients:
+            yield writer.writerow((
+                ingredient["ingredient__name"],
+                ingredient["sum_total"],
+                ingredient["ingredient__measurement_unit"],
+            ))
+
+
+class PDFExporter(ShoppingCartExporter):
+    extension = "pdf"
+    content_type = "application/pdf"
+    left = 70
+    top = 800
+    bottom = 50
+    leading = 20
+
+    def new_text(self, pdf, y_position):
+        text = pdf.beginText(self.left, y_position)
+        text.setFont(FONT, 12)
+        text.setLeading(self.leading)
+        return text
+
+    def write(self, file):
+        pdf = canvas.Canvas(file, pagesize=A4)
+        pdf.setFont(FONT_BOLD, 16)
+        pdf.drawString(200, self.top, TITLE)
+        text = self.new_text(pdf, self.top - 50)
+        for index, ingredient in enumerate(self.ingredients, start=1):
+            if text.getY() < self.bottom:
+                pdf.drawText(text)
+                pdf.showPage()
+                text = self.new_text(pdf, self.top)
+            text.textLine(format_line(index, ingredient))
+        pdf.drawText(text)
+        pdf.save()
+
+    def response(self, name):
+        file = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        self.write(file)
+        file.seek(0)
+        return FileResponse(
+            file,
+            as_attachment=True,
+            filename=self.get_filename(name),
+            content_type=self.content_type,
+        )
+
+
+EXPORTERS = {
+    exporter.extension: exporter
+    for exporter in (PDFExporter, TXTExporter, CSVExporter)
+}
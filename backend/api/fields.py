@@ -1,23 +1,236 @@
 import base64
+import binascii
+from urllib.parse import urlsplit
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import ImageFile
 from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import MANY_RELATION_KWARGS, ManyRelatedField
+
+from .catalog import attach_tag_ids, context_snapshot, tag_catalog
+
+# Кратно 4, чтобы каждый кусок base64 декодировался независимо.
+DECODE_CHUNK_SIZE = 64 * 1024
+
+
+def same_content(field_file, file):
+    """Совпадает ли загруженный файл с уже сохранённым."""
+    try:
+        if not field_file or field_file.size != file.size:
+            return False
+        with field_file.open("rb"):
+            same = all(
+                stored == uploaded
+                for stored, uploaded in zip(field_file.chunks(), file.chunks())
+            )
+    except OSError:
+        return False
+    finally:
+        file.seek(0)
+    return same
+
+
+def media_path(url):
+    """Ссылка на файл из MEDIA без хоста."""
+    if url and "/backend_media" in url:
+        url_parts = url.split("/backend_media")
+        if len(url_parts) > 1:
+            url_without_host = '/backend_media' + url_parts[1]
+            return url_without_host
+    return url
+
+
+class DecodedImageFile(TemporaryUploadedFile):
+    """Временный файл с декодированным изображением.
+
+    Хранилище перемещает его на место, поэтому при сборке мусора файл
+    закрывается так же, как загруженные файлы запроса.
+    """
+
+    def __del__(self):
+        self.close()
 
 
 class Base64ImageField(serializers.ImageField):
+    default_error_messages = {
+        "too_large": "Размер изображения не должен превышать {max_size} байт.",
+        "too_big": (
+            "Ширина и высота изображения не должны превышать {max_dimension}"
+            " пикселей."
+        ),
+        "invalid_base64": "Некорректные данные изображения.",
+    }
+
+    def check_dimensions(self, parser, chunk):
+        """Проверка размеров по заголовку, до декодирования всего файла."""
+        parser.feed(chunk)
+        if parser.image is None:
+            return False
+        max_dimension = settings.IMAGE_MAX_DIMENSION
+        if max(parser.image.size) > max_dimension:
+            self.fail("too_big", max_dimension=max_dimension)
+        return True
+
+    def decode(self, data):
+        format, imgstr = data.split(";base64,")
+        ext = format.split("/")[-1]
+        max_size = settings.IMAGE_MAX_UPLOAD_SIZE
+        if len(imgstr) // 4 * 3 > max_size:
+            self.fail("too_large", max_size=max_size)
+
+        file = DecodedImageFile(
+            "temp." + ext, format.split(":")[-1], 0, None
+        )
+        parser = ImageFile.Parser()
+        header_checked = False
+        try:
+            for start in range(0, len(imgstr), DECODE_CHUNK_SIZE):
+                chunk = base64.b64decode(
+                    imgstr[start:start + DECODE_CHUNK_SIZE]
+                )
+                file.write(chunk)
+                if not header_checked:
+                    header_checked = self.check_dimensions(parser, chunk)
+        except (binascii.Error, ValueError, OSError):
+            file.close()
+            self.fail("invalid_base64")
+        except serializers.ValidationError:
+            file.close()
+            raise
+        file.size = file.tell()
+        file.seek(0)
+        return file
+
+    def is_current(self, url):
+        """Клиент прислал ссылку на текущее изображение, а не новое."""
+        instance = getattr(self.parent, "instance", None)
+        current = getattr(instance, self.source, None)
+        if not current:
+            return False
+        return (
+            urlsplit(url).path
+            == urlsplit(self.to_representation(current)).path
+        )
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith("data:image"):
-            format, imgstr = data.split(";base64,")
-            ext = format.split("/")[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name="temp." + ext)
+            data = self.decode(data)
+        elif isinstance(data, str) and self.is_current(data):
+            raise SkipField
         return super().to_internal_value(data)
 
     def to_representation(self, value):
-        url = super().to_representation(value)
-        if url and "/backend_media" in url:
-            url_parts = url.split("/backend_media")
-            if len(url_parts) > 1:
-                url_without_host = '/backend_media' + url_parts[1]
-                return url_without_host
-        return url
+        return media_path(super().to_representation(value))
+
+
+class BulkManyRelatedField(ManyRelatedField):
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.child_relation.preload(data)
+        return super().to_internal_value(data)
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Первичный ключ, объекты которого загружаются пачкой.
+
+    Все id списка запрашиваются одним in_bulk, отсутствующие попадают в
+    одну ошибку. Объекты хранятся в контексте сериализатора, то есть
+    живут один запрос и общие для всех полей с той же моделью.
+    """
+
+    default_error_messages = {
+        "does_not_exist_many": (
+            "Недопустимые первичные ключи {pk_values} - объекты не существуют."
+        ),
+    }
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def loaded(self):
+        related = self.context.setdefault("related_objects", {})
+        return related.setdefault(self.get_queryset().model, {})
+
+    def to_pk(self, data):
+        if data is None or isinstance(data, bool):
+            raise TypeError
+        return self.get_queryset().model._meta.pk.to_python(data)
+
+    def load(self, pks):
+        """Догружает недостающие объекты, возвращает отсутствующие id."""
+        loaded = self.loaded()
+        wanted = set(pks) - loaded.keys()
+        if wanted:
+            loaded.update(self.get_queryset().in_bulk(wanted))
+        return sorted(wanted - loaded.keys())
+
+    def preload(self, values):
+        """Загружает объекты для списка id одним запросом.
+
+        Некорректные значения пропускаются: их ошибки сообщит
+        to_internal_value при разборе элемента.
+        """
+        pks = []
+        for value in values:
+            try:
+                pks.append(self.to_pk(value))
+            except (TypeError, ValueError, DjangoValidationError):
+                continue
+        missing = self.load(pks)
+        if missing:
+            self.fail(
+                "does_not_exist_many",
+                pk_values=", ".join(map(str, missing)),
+            )
+
+    def to_internal_value(self, data):
+        try:
+            pk = self.to_pk(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        if self.load([pk]):
+            self.fail("does_not_exist", pk_value=data)
+        return self.loaded()[pk]
+
+
+class CatalogField(serializers.ReadOnlyField):
+    """Поле объекта из справочника в памяти процесса по его id."""
+
+    def __init__(self, table, field, **kwargs):
+        self.table = table
+        self.index = table.fields.index(field)
+        super().__init__(**kwargs)
+
+    def to_representation(self, pk):
+        row = self.table.get(pk, context_snapshot(self.context, self.table))
+        return row[self.index]
+
+
+class CatalogTagsField(serializers.ReadOnlyField):
+    """Теги рецепта из справочника, в порядке модели Tag.
+
+    id тегов берутся из recipe.tag_ids, которые для списка рецептов
+    проставляет attach_tag_ids, иначе запрашиваются для одного рецепта.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs["source"] = "*"
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if getattr(recipe, "tag_ids", None) is None:
+            attach_tag_ids((recipe,))
+        return [
+            tag_catalog.as_dict(row)
+            for row in tag_catalog.ordered(
+                recipe.tag_ids, context_snapshot(self.context, tag_catalog)
+            )
+        ]
@@ -1,9 +1,24 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, Recipe
+from recipes.search import search_recipes
+
+from .catalog import tag_catalog
 
 User = get_user_model()
 
+ORDERINGS = {
+    "recent": ("-pub_date", "-id"),
+    "popular": ("-favourites_count", "-pub_date", "-id"),
+}
+
+TAGS_MODES = ("any", "all")
+
+
+def tag_choices():
+    return tag_catalog.values_list("slug", "slug")
+
 
 class IngredientFilter(FilterSet):
     name = filters.CharFilter(lookup_expr="startswith")
@@ -14,10 +29,13 @@ class IngredientFilter(FilterSet):
 
 
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name="tags__slug",
-        to_field_name="slug",
-        queryset=Tag.objects.all(),
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method="filter_tags",
+    )
+    tags_mode = filters.ChoiceFilter(
+        choices=tuple((mode, mode) for mode in TAGS_MODES),
+        method="filter_tags_mode",
     )
 
     is_favorited = filters.BooleanFilter(
@@ -26,14 +44,22 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method="filter_is_in_shopping_cart"
     )
+    search = filters.CharFilter(method="filter_search")
+    ordering = filters.ChoiceFilter(
+        choices=tuple((name, name) for name in ORDERINGS),
+        method="filter_ordering",
+    )
 
     class Meta:
         model = Recipe
         fields = (
             "tags",
+            "tags_mode",
             "author",
             "is_favorited",
             "is_in_shopping_cart",
+            "search",
+            "ordering",
         )
 
     def is_anonymous_or_in_db(self, queryset, name, value, related_field):
@@ -55,3 +81,33 @@ class RecipeFilter(FilterSet):
         return (
             self.is_anonymous_or_in_db
             (queryset, name, value, "favourite"))
+
+    def filter_tags(self, queryset, name, value):
+        """Рецепты с любым из тегов или, при tags_mode=all, со всеми.
+
+        Каждое условие — EXISTS по таблице связей рецептов с тегами: без
+        JOIN строки рецептов не размножаются и не нужен DISTINCT.
+        """
+        slug_ids = dict(tag_catalog.values_list("slug", "id"))
+        tag_ids = [slug_ids[slug] for slug in value if slug in slug_ids]
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef("pk")
+        )
+        if self.form.cleaned_data.get("tags_mode") != "all":
+            return queryset.filter(
+                Exists(recipe_tags.filter(tag_id__in=tag_ids))
+            )
+        for tag_id in tag_ids:
+            queryset = queryset.filter(
+                Exists(recipe_tags.filter(tag_id=tag_id))
+            )
+        return queryset
+
+    def filter_tags_mode(self, queryset, name, value):
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*ORDERINGS[value])
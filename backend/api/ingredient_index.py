@@ -0,0 +1,69 @@
+import threading
+from bisect import bisect_left
+from itertools import chain
+
+from recipes.models import Ingredient
+
+from .cache import generation_name, get_generation
+from .catalog import ingredient_catalog
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Названия хранятся в отсортированном массиве в нижнем регистре: поиск
+    по префиксу идёт бинарным поиском, совпадения по подстроке добавляются
+    после префиксных. Индекс строится при первом обращении и перестраивается,
+    когда меняется поколение модели Ingredient. Ключи и строки хранятся
+    одним кортежем, чтобы читатель без блокировки не получил ключи одной
+    версии со строками другой.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.generation = None
+        self.index = ((), ())
+
+    def build(self):
+        ingredients = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in ingredient_catalog.refresh().rows
+        )
+        keys = tuple(ingredient[0] for ingredient in ingredients)
+        rows = tuple(
+            {"id": pk, "name": name, "measurement_unit": measurement_unit}
+            for _, pk, name, measurement_unit in ingredients
+        )
+        return keys, rows
+
+    def refresh(self):
+        generation = get_generation(generation_name(Ingredient))
+        index = self.index
+        if generation == self.generation:
+            return index
+        with self.lock:
+            if generation != self.generation:
+                self.index = self.build()
+                self.generation = generation
+            return self.index
+
+    def search(self, query, limit=None):
+        keys, rows = self.refresh()
+        query = query.casefold()
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        result = list(rows[start:end])
+        if limit is not None and len(result) >= limit:
+            return result[:limit]
+        for index in chain(range(start), range(end, len(keys))):
+            if query not in keys[index]:
+                continue
+            result.append(rows[index])
+            if limit is not None and len(result) >= limit:
+                break
+        return result
+
+
+ingredient_index = IngredientIndex()
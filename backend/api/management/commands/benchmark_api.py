@@ -0,0 +1,172 @@
+import json
+import math
+import statistics
+import time
+
+from api.filters import RecipeFilter
+from api.queries import record_queries
+from api.serializers import RecipeReadSerializer
+from api.views import CustomUserViewSet, RecipeViewSet
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.http import QueryDict
+from django.test.utils import override_settings
+from recipes.models import Recipe, Tag
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+User = get_user_model()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = max(math.ceil(len(values) * fraction) - 1, 0)
+    return values[index]
+
+
+def consume(response):
+    """Полностью читает ответ, в том числе потоковый."""
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.render().content)
+
+
+class Command(BaseCommand):
+    help = "Микробенчмарки сериализаторов, фильтров и выгрузки списка покупок"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument(
+            "--username",
+            help="Пользователь для запросов; по умолчанию с самой большой "
+                 "корзиной",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Вывести результат в JSON"
+        )
+
+    def get_user(self, username):
+        if username:
+            user = User.objects.filter(username=username).first()
+        else:
+            user = (
+                User.objects.annotate(cart=Count("shopping_cart"))
+                .order_by("-cart", "id")
+                .first()
+            )
+        if user is None:
+            raise CommandError(
+                "Нет пользователей, сначала выполните generate_data."
+            )
+        return user
+
+    def get_cases(self, user):
+        factory = APIRequestFactory()
+
+        def request(path, **params):
+            drf_request = Request(factory.get(path, params))
+            drf_request.user = user
+            return drf_request
+
+        def recipe_serializer():
+            list_request = request("/api/recipes/")
+            viewset = RecipeViewSet(request=list_request, action="list")
+            recipes = viewset.get_queryset()[:6]
+            return len(RecipeReadSerializer(
+                recipes, many=True, context={"request": list_request}
+            ).data)
+
+        def recipe_filter():
+            data = QueryDict(mutable=True)
+            data.setlist("tags", list(
+                Tag.objects.values_list("slug", flat=True)[:2]
+            ))
+            data["is_favorited"] = "1"
+            filterset = RecipeFilter(
+                data, queryset=Recipe.objects.all(),
+                request=request("/api/recipes/"),
+            )
+            return len(filterset.qs[:6])
+
+        def call(viewset, name, path, **params):
+            # Как и роутер, передаём параметры из @action во view.
+            view = viewset.as_view(
+                {"get": name}, **getattr(viewset, name).kwargs
+            )
+
+            def run():
+                django_request = factory.get(path, params)
+                force_authenticate(django_request, user=user)
+                response = view(django_request)
+                if response.status_code != 200:
+                    raise CommandError(f"{path}: {response.status_code}")
+                return consume(response)
+            return run
+
+        cases = {
+            "RecipeReadSerializer": recipe_serializer,
+            "SubscriptionSerializer": call(
+                CustomUserViewSet, "subscriptions",
+                "/api/users/subscriptions/", recipes_limit=3,
+            ),
+            "RecipeFilter": recipe_filter,
+        }
+        for extension in ("txt", "csv", "pdf"):
+            cases[f"download_shopping_cart.{extension}"] = call(
+                RecipeViewSet, "download_shopping_cart",
+                "/api/recipes/download_shopping_cart/",
+                format=extension,
+            )
+        return cases
+
+    @staticmethod
+    def measure(case, rounds, warmup):
+        for _ in range(warmup):
+            case()
+        timings = []
+        queries = 0
+        for _ in range(rounds):
+            with record_queries() as recorder:
+                started = time.perf_counter()
+                case()
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = max(queries, recorder.count)
+        return {
+            "min_ms": round(min(timings), 3),
+            "mean_ms": round(statistics.mean(timings), 3),
+            "p95_ms": round(percentile(timings, 0.95), 3),
+            "queries": queries,
+            "rounds": rounds,
+        }
+
+    def handle(self, *args, **options):
+        if options["rounds"] < 1:
+            raise CommandError("--rounds должен быть больше нуля.")
+        user = self.get_user(options["username"])
+        results = {}
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]
+        ):
+            for name, case in self.get_cases(user).items():
+                results[name] = self.measure(
+                    case, options["rounds"], options["warmup"]
+                )
+        if options["json"]:
+            self.stdout.write(json.dumps(
+                {"user": user.username, "results": results}, indent=2
+            ))
+            return
+        self.stdout.write(f"Пользователь: {user.username}")
+        self.stdout.write(
+            f"{'':<36}{'min, мс':>10}{'mean, мс':>10}{'p95, мс':>10}"
+            f"{'запросов':>10}"
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<36}{result['min_ms']:>10.2f}"
+                f"{result['mean_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                f"{result['queries']:>10}"
+            )
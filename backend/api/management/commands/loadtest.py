@@ -0,0 +1,259 @@
+import asyncio
+import json
+import re
+import time
+from collections import defaultdict
+from urllib.parse import quote, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from .benchmark_api import percentile
+
+ANONYMOUS_PATHS = (
+    "/api/recipes/",
+    "/api/recipes/?ordering=popular",
+    "/api/tags/",
+    "/api/ingredients/?name=" + quote("а"),
+)
+AUTHENTICATED_PATHS = (
+    "/api/recipes/?is_favorited=1",
+    "/api/users/subscriptions/?recipes_limit=3",
+    "/api/recipes/download_shopping_cart/?format=txt",
+)
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+# Медленные клиенты отправляют и читают данные порциями с этим интервалом.
+SLOW_TICK = 0.1
+
+
+class HTTPConnection:
+    """Минимальный HTTP/1.1 клиент с keep-alive поверх asyncio."""
+
+    def __init__(self, host, port, headers):
+        self.host = host
+        self.port = port
+        self.headers = headers
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def get(self, path):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        self.writer.write(
+            f"GET {path} HTTP/1.1\r\n{self.headers}\r\n".encode()
+        )
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Сервер закрыл соединение")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = (await self.reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        await self.read_body(headers)
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, headers
+
+    async def read_body(self, headers):
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    return
+        elif "content-length" in headers:
+            await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            await self.reader.read()
+            await self.close()
+
+
+async def slow_client(host, port, request, rate, deadline):
+    """Клиент на медленном канале: rate байт в секунду в обе стороны.
+
+    Пока запрос не дочитан, а ответ не забран, синхронный воркер занят
+    этим соединением; ASGI-сервер в это время обслуживает остальных.
+    """
+    step = max(int(rate * SLOW_TICK), 1)
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            await asyncio.sleep(SLOW_TICK)
+            continue
+        try:
+            for start in range(0, len(request), step):
+                writer.write(request[start:start + step])
+                await writer.drain()
+                await asyncio.sleep(SLOW_TICK)
+            while time.monotonic() < deadline:
+                if not await reader.read(step):
+                    break
+                await asyncio.sleep(SLOW_TICK)
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест API: p50/p95/p99, RPS и число SQL-запросов "
+        "на запрос (из заголовка Server-Timing)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument(
+            "--duration", type=float, default=10, help="Секунд на тест"
+        )
+        parser.add_argument(
+            "--token", help="Токен для эндпоинтов, требующих авторизации"
+        )
+        parser.add_argument(
+            "--path", action="append", dest="paths",
+            help="Путь для нагрузки, можно указать несколько раз",
+        )
+        parser.add_argument(
+            "--slow-clients", type=int, default=0,
+            help="Число дополнительных медленных соединений",
+        )
+        parser.add_argument(
+            "--slow-rate", type=int, default=50,
+            help="Скорость медленного клиента, байт в секунду",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Вывести результат в JSON"
+        )
+
+    async def worker(self, connection, paths, offset, deadline, results):
+        index = offset
+        while time.monotonic() < deadline:
+            path = paths[index % len(paths)]
+            index += 1
+            started = time.perf_counter()
+            try:
+                status, headers = await connection.get(path)
+            except (OSError, ValueError, IndexError,
+                    asyncio.IncompleteReadError):
+                await connection.close()
+                results[path]["errors"] += 1
+                continue
+            results[path]["latencies"].append(
+                (time.perf_counter() - started) * 1000
+            )
+            if status >= 400:
+                results[path]["errors"] += 1
+            queries = SERVER_TIMING_QUERIES.search(
+                headers.get("server-timing", "")
+            )
+            if queries:
+                results[path]["queries"].append(int(queries.group(1)))
+        await connection.close()
+
+    async def run(self, options, paths):
+        url = urlsplit(options["url"])
+        if url.scheme != "http":
+            raise CommandError("Поддерживается только http://")
+        headers = f"Host: {url.netloc}\r\nAccept: */*\r\n"
+        if options["token"]:
+            headers += f"Authorization: Token {options['token']}\r\n"
+        prefix = url.path.rstrip("/")
+        paths = [prefix + path for path in paths]
+        port = url.port or 80
+        results = defaultdict(
+            lambda: {"latencies": [], "queries": [], "errors": 0}
+        )
+        deadline = time.monotonic() + options["duration"]
+        started = time.monotonic()
+        await asyncio.gather(
+            *(
+                self.worker(
+                    HTTPConnection(
+                        url.hostname, port,
+                        headers + "Connection: keep-alive\r\n",
+                    ),
+                    paths, offset, deadline, results,
+                )
+                for offset in range(options["concurrency"])
+            ),
+            *(
+                slow_client(
+                    url.hostname, port,
+                    f"GET {paths[index % len(paths)]} HTTP/1.1\r\n"
+                    f"{headers}Connection: close\r\n\r\n".encode(),
+                    options["slow_rate"], deadline,
+                )
+                for index in range(options["slow_clients"])
+            ),
+        )
+        return results, time.monotonic() - started
+
+    @staticmethod
+    def summarize(results, elapsed):
+        summary = {}
+        for path, result in results.items():
+            latencies = result["latencies"] or [0]
+            queries = result["queries"]
+            summary[path] = {
+                "requests": len(result["latencies"]),
+                "errors": result["errors"],
+                "rps": round(len(result["latencies"]) / elapsed, 1),
+                "p50_ms": round(percentile(latencies, 0.50), 2),
+                "p95_ms": round(percentile(latencies, 0.95), 2),
+                "p99_ms": round(percentile(latencies, 0.99), 2),
+                "queries": (
+                    round(sum(queries) / len(queries), 1) if queries else None
+                ),
+            }
+        return summary
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency должен быть больше нуля.")
+        if options["slow_clients"] < 0 or options["slow_rate"] < 1:
+            raise CommandError(
+                "--slow-clients не может быть отрицательным, "
+                "--slow-rate должен быть больше нуля."
+            )
+        paths = options["paths"] or (
+            ANONYMOUS_PATHS
+            + (AUTHENTICATED_PATHS if options["token"] else ())
+        )
+        results, elapsed = asyncio.run(self.run(options, list(paths)))
+        summary = self.summarize(results, elapsed)
+        total = sum(result["requests"] for result in summary.values())
+        if options["json"]:
+            self.stdout.write(json.dumps({
+                "duration": round(elapsed, 2),
+                "slow_clients": options["slow_clients"],
+                "rps": round(total / elapsed, 1),
+                "results": summary,
+            }, indent=2))
+            return
+        self.stdout.write(
+            f"{'':<52}{'RPS':>8}{'p50':>8}{'p95':>8}{'p99':>8}"
+            f"{'ошибок':>8}{'SQL':>6}"
+        )
+        for path, result in summary.items():
+            queries = result["queries"]
+            self.stdout.write(
+                f"{path[:52]:<52}{result['rps']:>8}{result['p50_ms']:>8}"
+                f"{result['p95_ms']:>8}{result['p99_ms']:>8}"
+                f"{result['errors']:>8}"
+                f"{'-' if queries is None else queries:>6}"
+            )
+        self.stdout.write(
+            f"Всего запросов: {total}, RPS: {total / elapsed:.1f}"
+        )
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .queries import (QueryBudgetExceeded, QueryRecorder, check_budget,
+                      record_queries)
+
+logger = logging.getLogger("api.queries")
+
+
+class QueryInstrumentationMiddleware:
+    """Число и время SQL-запросов на каждый запрос к API.
+
+    Данные отдаются в заголовке Server-Timing и в структурированном логе
+    api.queries. Превышение QUERY_BUDGETS пишется в лог как предупреждение,
+    а с QUERY_BUDGET_STRICT приводит к QueryBudgetExceeded.
+
+    Под ASGI запросы выполняются в других потоках, поэтому счётчик
+    передаётся в request.query_recorder и подключается там (async_views).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Так Django распознаёт асинхронный middleware.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with record_queries() as recorder:
+            request.query_recorder = recorder
+            response = self.get_response(request)
+        return self.report(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        recorder = request.query_recorder = QueryRecorder()
+        response = await self.get_response(request)
+        return self.report(request, response, recorder, started)
+
+    @staticmethod
+    def report(request, response, recorder, started):
+        total = (time.perf_counter() - started) * 1000
+        response["Server-Timing"] = (
+            f'db;dur={recorder.duration * 1000:.2f};'
+            f'desc="{recorder.count} queries", app;dur={total:.2f}'
+        )
+        view = getattr(request, "query_budget_view", None)
+        report = dict(
+            recorder.report(),
+            view=view,
+            method=request.method,
+            path=request.path,
+            status=response.status_code,
+            total_ms=round(total, 2),
+        )
+        message = json.dumps(report, ensure_ascii=False)
+        if not check_budget(view, recorder):
+            logger.info(message)
+            return response
+        logger.warning(message)
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        return response
+
+    @staticmethod
+    def process_view(request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, "cls", None)
+        if view_class is None:
+            return
+        actions = getattr(view_func, "actions", None) or {}
+        action = actions.get(request.method.lower(), request.method.lower())
+        request.query_budget_view = f"{view_class.__name__}.{action}"
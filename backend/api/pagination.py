@@ -1,7 +1,195 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomPageNumberPagination(PageNumberPagination):
+    """Постраничная пагинация с двумя дополнительными режимами.
+
+    ?cursor= включает keyset-пагинацию по полям сортировки queryset
+    (последним полем всегда идёт pk), ?count=false отключает COUNT.
+    """
+
     page_size = 6
     page_size_query_param = "limit"
     max_page_size = 15
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    invalid_cursor_message = "Неверный курсор."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.mode = "page"
+        if self.cursor_query_param in request.query_params:
+            self.mode = "cursor"
+            return self.paginate_cursor(queryset, request)
+        if request.query_params.get(self.count_query_param) == "false":
+            self.mode = "no_count"
+            return self.paginate_without_count(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.mode == "page":
+            return super().get_paginated_response(data)
+        response = OrderedDict()
+        if self.mode == "no_count":
+            response["count"] = None
+        response["next"] = self.next_link
+        response["previous"] = self.previous_link
+        response["results"] = data
+        return Response(response)
+
+    def paginate_without_count(self, queryset, request):
+        page_size = self.get_page_size(request)
+        try:
+            page_number = max(int(request.query_params.get(
+                self.page_query_param, 1
+            )), 1)
+        except ValueError:
+            page_number = 1
+        offset = (page_number - 1) * page_size
+        page = list(queryset[offset:offset + page_size + 1])
+        url = self.request.build_absolute_uri()
+        self.next_link = None
+        if len(page) > page_size:
+            self.next_link = replace_query_param(
+                url, self.page_query_param, page_number + 1
+            )
+        self.previous_link = None
+        if page_number == 2:
+            self.previous_link = remove_query_param(
+                url, self.page_query_param
+            )
+        elif page_number > 2:
+            self.previous_link = replace_query_param(
+                url, self.page_query_param, page_number - 1
+            )
+        return page[:page_size]
+
+    @staticmethod
+    def get_ordering(queryset):
+        ordering = list(
+            queryset.query.order_by or queryset.model._meta.ordering
+        )
+        names = [field.lstrip("-") for field in ordering]
+        if "pk" not in names and queryset.model._meta.pk.name not in names:
+            descending = bool(ordering) and ordering[-1].startswith("-")
+            ordering.append("-pk" if descending else "pk")
+        return [
+            (field.lstrip("-"), field.startswith("-")) for field in ordering
+        ]
+
+    @staticmethod
+    def get_field(queryset, name):
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        if name == "pk":
+            return queryset.model._meta.pk
+        return queryset.model._meta.get_field(name)
+
+    def decode_cursor(self, queryset, ordering, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(ordering):
+                raise ValueError
+            return [
+                self.get_field(queryset, name).to_python(value)
+                for (name, _), value in zip(ordering, values)
+            ]
+        except (
+            binascii.Error, ValueError, TypeError, ValidationError,
+            FieldDoesNotExist,
+        ):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def encode_cursor(ordering, obj):
+        values = [getattr(obj, name) for name, _ in ordering]
+        return base64.urlsafe_b64encode(
+            json.dumps(values, default=str).encode()
+        ).decode()
+
+    @staticmethod
+    def after(ordering, values):
+        """Условие «строго после values» в порядке сортировки ordering."""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(ordering, values):
+            lookup = "lt" if descending else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        name, descending = ordering[0]
+        bound = Q(**{f"{name}__{'lte' if descending else 'gte'}": values[0]})
+        return bound & condition
+
+    def paginate_cursor(self, queryset, request):
+        page_size = self.get_page_size(request)
+        ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*(
+            f"-{name}" if descending else name
+            for name, descending in ordering
+        ))
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.after(
+                ordering, self.decode_cursor(queryset, ordering, cursor)
+            ))
+        page = list(queryset[:page_size + 1])
+        self.next_link = None
+        self.previous_link = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_link = replace_query_param(
+                request.build_absolute_uri(),
+                self.cursor_query_param,
+                self.encode_cursor(ordering, page[-1]),
+            )
+        return page
+
+
+class MatchPagination(CustomPageNumberPagination):
+    """Пагинация подбора по ингредиентам: страницы и ?count=false.
+
+    Результаты подбора — последовательность, а не queryset, поэтому
+    keyset-пагинации по ?cursor= у неё нет.
+    """
+
+    cursor_query_param = None
+
+
+class FeedPagination(CustomPageNumberPagination):
+    """Keyset-пагинация ленты подписок.
+
+    Страницу читает функция read_page(limit, after), курсор хранит
+    (pub_date, recipe_id) последней строки.
+    """
+
+    ordering = [("pub_date", True), ("recipe_id", True)]
+
+    def paginate_feed(self, request, read_page, queryset):
+        self.request = request
+        self.mode = "cursor"
+        page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        after = None
+        if cursor:
+            after = self.decode_cursor(queryset, self.ordering, cursor)
+        page = read_page(page_size + 1, after)
+        self.next_link = None
+        self.previous_link = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_link = replace_query_param(
+                request.build_absolute_uri(),
+                self.cursor_query_param,
+                self.encode_cursor(self.ordering, page[-1]),
+            )
+        return page
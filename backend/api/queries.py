@@ -0,0 +1,92 @@
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+PLACEHOLDER_LISTS = re.compile(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)")
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+SPACES = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """Нормализованный SQL: без литералов и с единым видом IN (...)."""
+    sql = LITERALS.sub("?", sql)
+    sql = PLACEHOLDER_LISTS.sub("(...)", sql)
+    return SPACES.sub(" ", sql).strip()
+
+
+class QueryRecorder:
+    """Обёртка execute_wrapper, собирающая число и время запросов."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        return {
+            sql: count
+            for sql, count in self.fingerprints.most_common()
+            if count > 1
+        }
+
+    def report(self):
+        return {
+            "queries": self.count,
+            "db_ms": round(self.duration * 1000, 2),
+            "duplicates": self.duplicates,
+        }
+
+
+@contextmanager
+def record_queries(recorder=None):
+    """Считает запросы всех соединений текущего потока.
+
+    Переданный recorder позволяет продолжить подсчёт в другом потоке.
+    """
+    recorder = recorder or QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+def check_budget(name, recorder):
+    """Превышен ли бюджет запросов из QUERY_BUDGETS для view.action."""
+    budget = settings.QUERY_BUDGETS.get(name)
+    return budget is not None and recorder.count > budget
+
+
+@contextmanager
+def assert_max_queries(max_queries, allow_duplicates=True):
+    """Для тестов: ошибка, если блок выполнил больше max_queries запросов.
+
+    С allow_duplicates=False ошибкой считается и любой повторённый запрос,
+    типичный признак N+1.
+    """
+    with record_queries() as recorder:
+        yield recorder
+    if recorder.count > max_queries or (
+        not allow_duplicates and recorder.duplicates
+    ):
+        raise QueryBudgetExceeded(
+            f"Ожидалось не больше {max_queries} запросов: "
+            f"{recorder.report()}"
+        )
@@ -0,0 +1,264 @@
+import threading
+from collections import defaultdict, namedtuple
+from collections.abc import Sequence
+from functools import reduce
+from itertools import groupby
+from operator import itemgetter, or_
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from recipes.models import RecipeIngredient
+
+from .cache import bump_generation, get_generation
+
+GENERATION = "api.recipe_matcher"
+CHANGE_KEY = "api:recipe_matcher:change:{}"
+# Если отставание больше, индекс дешевле перестроить целиком.
+MAX_CHANGES = 1000
+CHANGE_TIMEOUT = 60 * 60 * 24
+# Элемент множества занимает в памяти примерно как 400 бит маски: редкие
+# ингредиенты хранятся множествами, частые — битовыми масками.
+DENSE_RATIO = 400
+
+Index = namedtuple("Index", "postings sizes")
+
+
+def log_recipe_changes(*recipe_ids):
+    """Записывает рецепты с изменённым составом в журнал в кэше.
+
+    Каждой записи соответствует свой номер в последовательности, поэтому
+    процессы догоняют базу, перечитывая только изменённые рецепты.
+    """
+    for recipe_id in recipe_ids:
+        sequence = bump_generation(GENERATION)
+        cache.set(CHANGE_KEY.format(sequence), recipe_id, CHANGE_TIMEOUT)
+
+
+def invalidate_recipe_matcher():
+    """Сдвиг без записи в журнал: индексы перестроятся полностью."""
+    bump_generation(GENERATION)
+
+
+def to_mask(recipes):
+    """Битовая маска, в которой бит с номером id рецепта равен 1."""
+    if isinstance(recipes, int):
+        return recipes
+    if not recipes:
+        return 0
+    bits = bytearray(max(recipes) // 8 + 1)
+    for recipe_id in recipes:
+        bits[recipe_id >> 3] |= 1 << (recipe_id & 7)
+    return int.from_bytes(bits, "little")
+
+
+def contains(recipes, recipe_id):
+    if isinstance(recipes, int):
+        return recipes >> recipe_id & 1
+    return recipe_id in recipes
+
+
+def add(recipes, recipe_id):
+    if isinstance(recipes, int):
+        return recipes | 1 << recipe_id
+    return recipes | {recipe_id}
+
+
+def remove(recipes, recipe_id):
+    if isinstance(recipes, int):
+        return recipes & ~(1 << recipe_id)
+    return recipes - {recipe_id}
+
+
+def count_planes(masks):
+    """Побитовый сумматор: i-я маска — i-й разряд числа совпадений."""
+    planes = []
+    for carry in masks:
+        for index, plane in enumerate(planes):
+            planes[index], carry = plane ^ carry, plane & carry
+            if not carry:
+                break
+        if carry:
+            planes.append(carry)
+    return planes
+
+
+def read_recipes(queryset):
+    rows = (
+        queryset.order_by("recipe_id")
+        .values_list("recipe_id", "ingredient_id")
+        .iterator(chunk_size=10000)
+    )
+    for recipe_id, group in groupby(rows, key=itemgetter(0)):
+        yield recipe_id, {ingredient_id for _, ingredient_id in group}
+
+
+class MatchResults(Sequence):
+    """Рецепты по убыванию числа совпавших ингредиентов.
+
+    При равенстве выше рецепт, которому не хватает меньше ингредиентов,
+    затем более новый. Элементы — (id рецепта, совпало, не хватает).
+    Все вычисления идут над битовыми масками, срез сортировать не нужно:
+    уровни перебираются по порядку, биты внутри уровня — от старших.
+    """
+
+    def __init__(self, masks, sizes):
+        self.sizes = sizes
+        self.masks_count = len(masks)
+        self.union = reduce(or_, masks, 0)
+        self.planes = count_planes(masks)
+        self.count = bin(self.union).count("1")
+
+    def __len__(self):
+        return self.count
+
+    def levels(self):
+        full = (1 << self.union.bit_length()) - 1
+        most = min(self.masks_count, (1 << len(self.planes)) - 1)
+        for matched in range(most, 0, -1):
+            level = full
+            for bit, plane in enumerate(self.planes):
+                level &= plane if matched >> bit & 1 else full ^ plane
+            if not level:
+                continue
+            for size in sorted(self.sizes):
+                if size < matched:
+                    continue
+                mask = level & self.sizes[size]
+                if mask:
+                    yield matched, size - matched, mask
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, _ = index.indices(len(self))
+        wanted = max(stop - start, 0)
+        skip = start
+        result = []
+        for matched, missing, mask in self.levels():
+            if len(result) >= wanted:
+                break
+            bits = bin(mask)
+            found = bits.count("1")
+            if skip >= found:
+                skip -= found
+                continue
+            position = 1
+            for _ in range(skip + 1):
+                position = bits.find("1", position + 1)
+            skip = 0
+            while position != -1 and len(result) < wanted:
+                result.append((len(bits) - 1 - position, matched, missing))
+                position = bits.find("1", position + 1)
+        return result
+
+
+class RecipeMatcher:
+    """Обратный индекс «ингредиент -> рецепты» в памяти процесса.
+
+    Для каждого ингредиента хранится множество id рецептов или битовая
+    маска, для каждого размера рецепта — маска рецептов с таким числом
+    ингредиентов. Структуры не изменяются на месте и публикуются одним
+    присваиванием кортежа Index, поэтому параллельные запросы читают
+    согласованный снимок. При изменении последовательности
+    GENERATION индекс применяет записи журнала изменений, а если журнал
+    неполон — перестраивается целиком.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sequence = None
+        self.index = Index({}, {})
+
+    def build(self):
+        postings = defaultdict(set)
+        sizes = defaultdict(set)
+        width = 0
+        for recipe_id, ingredients in read_recipes(
+            RecipeIngredient.objects.using(DEFAULT_DB_ALIAS)
+        ):
+            for ingredient_id in ingredients:
+                postings[ingredient_id].add(recipe_id)
+            sizes[len(ingredients)].add(recipe_id)
+            width = recipe_id
+        return Index(
+            {
+                ingredient_id: (
+                    to_mask(recipes)
+                    if len(recipes) * DENSE_RATIO > width
+                    else frozenset(recipes)
+                )
+                for ingredient_id, recipes in postings.items()
+            },
+            {size: to_mask(recipes) for size, recipes in sizes.items()},
+        )
+
+    def changes(self, sequence):
+        if self.sequence is None:
+            return None
+        if not 0 < sequence - self.sequence <= MAX_CHANGES:
+            return None
+        keys = [
+            CHANGE_KEY.format(number)
+            for number in range(self.sequence + 1, sequence + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return None
+        return set(changes.values())
+
+    def apply(self, recipe_ids):
+        fresh = dict(read_recipes(
+            RecipeIngredient.objects.using(DEFAULT_DB_ALIAS).filter(
+                recipe_id__in=recipe_ids
+            )
+        ))
+        postings = dict(self.index.postings)
+        sizes = dict(self.index.sizes)
+        for recipe_id in recipe_ids:
+            ingredients = fresh.get(recipe_id, set())
+            for ingredient_id, recipes in list(postings.items()):
+                if ingredient_id not in ingredients and contains(
+                    recipes, recipe_id
+                ):
+                    postings[ingredient_id] = remove(recipes, recipe_id)
+            for ingredient_id in ingredients:
+                postings[ingredient_id] = add(
+                    postings.get(ingredient_id, frozenset()), recipe_id
+                )
+            for size, recipes in list(sizes.items()):
+                if contains(recipes, recipe_id):
+                    sizes[size] = remove(recipes, recipe_id)
+            if ingredients:
+                sizes[len(ingredients)] = add(
+                    sizes.get(len(ingredients), 0), recipe_id
+                )
+        return Index(postings, sizes)
+
+    def refresh(self):
+        sequence = get_generation(GENERATION)
+        index = self.index
+        if sequence == self.sequence:
+            return index
+        with self.lock:
+            if sequence != self.sequence:
+                changes = self.changes(sequence)
+                if changes is None:
+                    self.index = self.build()
+                else:
+                    self.index = self.apply(changes)
+                self.sequence = sequence
+            return self.index
+
+    def match(self, ingredient_ids):
+        postings, sizes = self.refresh()
+        return MatchResults(
+            [
+                to_mask(postings[ingredient_id])
+                for ingredient_id in set(ingredient_ids)
+                if ingredient_id in postings
+            ],
+            sizes,
+        )
+
+
+recipe_matcher = RecipeMatcher()
@@ -0,0 +1,46 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ShoppingCartRenderer(BaseRenderer):
+    """Формат выгрузки списка покупок.
+
+    Файл формирует экспортёр из api.exporters, ответы с ошибками
+    отдаются через JSONRenderer (см. use_json_for_errors).
+    """
+
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if isinstance(data, dict):
+            data = "\n".join(str(value) for value in data.values())
+        return str(data).encode("utf-8")
+
+
+class PDFRenderer(ShoppingCartRenderer):
+    media_type = "application/pdf"
+    format = "pdf"
+    charset = None
+
+
+class TXTRenderer(ShoppingCartRenderer):
+    media_type = "text/plain"
+    format = "txt"
+
+
+class CSVRenderer(ShoppingCartRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+SHOPPING_CART_RENDERERS = (PDFRenderer, TXTRenderer, CSVRenderer, JSONRenderer)
+
+
+def use_json_for_errors(request, response):
+    """Подменяет формат выгрузки на JSON для ответа с ошибкой."""
+    if response.status_code >= 400 and isinstance(
+        getattr(request, "accepted_renderer", None), ShoppingCartRenderer
+    ):
+        request.accepted_renderer = JSONRenderer()
+        request.accepted_media_type = JSONRenderer.media_type
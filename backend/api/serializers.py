@@ -1,13 +1,21 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Manager
 from djoser.serializers import UserCreateSerializer, UserSerializer
+from recipes.cart import update_recipe_carts
+from recipes.images import schedule_image_variants
 from recipes.models import (FavouriteRecipe, Ingredient, Recipe,
-                            RecipeIngredient, ShoppingCart, Tag)
+                            RecipeIngredient, ShoppingCart,
+                            ShoppingCartIngredient, Tag)
+from recipes.signals import recipe_ingredients_changed
 from rest_framework import serializers, status
 from rest_framework.exceptions import ValidationError
 from users.models import Follow
 
-from .fields import Base64ImageField
+from .catalog import attach_tag_ids, ingredient_catalog
+from .fields import (Base64ImageField, BulkPrimaryKeyRelatedField,
+                     CatalogField, CatalogTagsField, same_content)
 from .serializers_mixins import IsAuthAndExistsMixin
 
 User = get_user_model()
@@ -28,6 +36,9 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        is_subscribed = getattr(obj, "is_subscribed", None)
+        if is_subscribed is not None:
+            return is_subscribed
         request = self.context.get("request")
         if request and request.user.is_authenticated:
             return Follow.objects.filter(
@@ -72,11 +83,13 @@ class TagsSerializer(serializers.ModelSerializer):
 
 
 class IngredientsRecipeSerializer(serializers.ModelSerializer):
-    name = serializers.ReadOnlyField(source="ingredient.name")
-    measurement_unit = serializers.ReadOnlyField(
-        source="ingredient.measurement_unit"
+    name = CatalogField(
+        ingredient_catalog, "name", source="ingredient_id"
     )
-    id = serializers.ReadOnlyField(source="ingredient.id")
+    measurement_unit = CatalogField(
+        ingredient_catalog, "measurement_unit", source="ingredient_id"
+    )
+    id = serializers.ReadOnlyField(source="ingredient_id")
 
     class Meta:
         model = RecipeIngredient
@@ -105,11 +118,13 @@ class SubscriptionSerializer(CustomUserSerializer):
         return ShortRecipeSerializer
 
     def get_recipes(self, object):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = object.recipes.all()
-        if limit:
-            recipes = recipes[:int(limit)]
+        recipes = getattr(object, "preview", None)
+        if recipes is None:
+            request = self.context.get('request')
+            limit = request.GET.get('recipes_limit')
+            recipes = object.recipes.all()
+            if limit:
+                recipes = recipes[:int(limit)]
         serializer = ShortRecipeSerializer(
             recipes,
             many=True,
@@ -119,33 +134,23 @@ class SubscriptionSerializer(CustomUserSerializer):
 
     @staticmethod
     def get_recipes_count(obj):
+        recipes_count = getattr(obj, "recipes_count", None)
+        if recipes_count is not None:
+            return recipes_count
         return Recipe.objects.filter(author=obj).count()
 
 
-class CreateSubscribeSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Follow
-        fields = ("user", "author")
-
-    def validate(self, data):
-        if self.context['request'].method == 'POST':
-            if self.context['request'].user == data['author']:
-                raise ValidationError(
-                    detail='Нельзя подписаться на себя.',
-                    code=status.HTTP_400_BAD_REQUEST
-                )
-            if Follow.objects.filter(
-                    user=self.context['request'].user,
-                    author=data['author']).exists():
-                raise ValidationError(
-                    detail='Вы уже подписаны',
-                    code=status.HTTP_400_BAD_REQUEST
-                )
-        return data
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.child.fields["id"].preload([
+                item.get("id") for item in data if isinstance(item, dict)
+            ])
+        return super().to_internal_value(data)
 
 
 class RecipeCreateIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
+    id = BulkPrimaryKeyRelatedField(
         source="ingredient",
         queryset=Ingredient.objects.all(),
     )
@@ -153,6 +158,7 @@ class RecipeCreateIngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = RecipeIngredient
         fields = ("id", "amount")
+        list_serializer_class = RecipeIngredientListSerializer
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer, IsAuthAndExistsMixin):
@@ -161,9 +167,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer, IsAuthAndExistsMixin):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     author = CustomUserSerializer(required=False)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True
-    )
+    tags = BulkPrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True)
 
     class Meta:
         model = Recipe
@@ -193,20 +197,14 @@ class RecipeWriteSerializer(serializers.ModelSerializer, IsAuthAndExistsMixin):
             raise serializers.ValidationError(
                 "Необходимо указать хотя бы один ингредиент.",
             )
-        ingredients_list = []
-        for value in values:
-            ingredient = (get_object_or_404
-                          (Ingredient, id=value["ingredient"].id)
-                          )
-            if int(value["amount"]) <= 0:
-                raise (
-                    serializers.ValidationError({"Вес должен быть больше 0."})
-                )
-            if ingredient in ingredients_list:
-                raise serializers.ValidationError(
-                    "Ингредиенты должны быть уникальными."
-                )
-            ingredients_list.append(ingredient)
+        if any(int(value["amount"]) <= 0 for value in values):
+            raise (
+                serializers.ValidationError({"Вес должен быть больше 0."})
+            )
+        if len({value["ingredient"].id for value in values}) != len(values):
+            raise serializers.ValidationError(
+                "Ингредиенты должны быть уникальными."
+            )
         return values
 
     @staticmethod
@@ -216,14 +214,11 @@ class RecipeWriteSerializer(serializers.ModelSerializer, IsAuthAndExistsMixin):
                 serializers.ValidationError
                 ("Необходимо выбрать хотя бы один тег.")
             )
-        tags_list = []
-        for tag in values:
-            if tag in tags_list:
-                raise (
-                    serializers.ValidationError
-                    ("Теги должны быть уникальными.")
-                )
-            tags_list.append(tag)
+        if len({tag.id for tag in values}) != len(values):
+            raise (
+                serializers.ValidationError
+                ("Теги должны быть уникальными.")
+            )
         return values
 
     @staticmethod
@@ -248,14 +243,80 @@ class RecipeWriteSerializer(serializers.ModelSerializer, IsAuthAndExistsMixin):
         obj = Recipe.objects.create(**validated_data)
         obj.tags.set(tags)
         self.ingredients_create(ingredients, obj)
+        recipe_ingredients_changed.send(sender=Recipe, recipe=obj)
+        schedule_image_variants(obj)
         return obj
 
+    def ingredients_update(self, ingredients, instance):
+        """Применяет к ингредиентам рецепта только разницу.
+
+        Возвращает изменения количеств {id ингредиента: разница}.
+        """
+        current = {
+            row.ingredient_id: row for row in instance.recipe_ingredients.all()
+        }
+        new = {
+            ingredient["ingredient"].id: ingredient["amount"]
+            for ingredient in ingredients
+        }
+        changed = []
+        deltas = {}
+        for ingredient_id, amount in new.items():
+            row = current.get(ingredient_id)
+            if row is None:
+                deltas[ingredient_id] = amount
+            elif row.amount != amount:
+                deltas[ingredient_id] = amount - row.amount
+                row.amount = amount
+                changed.append(row)
+        removed = [
+            row for ingredient_id, row in current.items()
+            if ingredient_id not in new
+        ]
+        for row in removed:
+            deltas[row.ingredient_id] = -row.amount
+        if removed:
+            RecipeIngredient.objects.filter(
+                pk__in=[row.pk for row in removed]
+            ).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ("amount",))
+        self.ingredients_create(
+            [
+                ingredient for ingredient in ingredients
+                if ingredient["ingredient"].id not in current
+            ],
+            instance,
+        )
+        return deltas
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients, tags = self.ingredients_and_tags(validated_data)
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.ingredients_create(ingredients, instance)
-        return super().update(instance, validated_data)
+        image = validated_data.get("image")
+        if image is not None and same_content(instance.image, image):
+            del validated_data["image"]
+        if tags is not None:
+            instance.tags.set(tags)
+        deltas = {}
+        if ingredients is not None:
+            deltas = self.ingredients_update(ingredients, instance)
+            update_recipe_carts(instance.id, deltas)
+        if "image" in validated_data:
+            validated_data.update(image_thumbnail="", image_webp="")
+        update_fields = [
+            name for name, value in validated_data.items()
+            if getattr(instance, name) != value
+        ]
+        for name in update_fields:
+            setattr(instance, name, validated_data[name])
+        if update_fields:
+            instance.save(update_fields=update_fields)
+        if deltas or {"name", "text"} & set(update_fields):
+            recipe_ingredients_changed.send(sender=Recipe, recipe=instance)
+        if "image" in update_fields:
+            schedule_image_variants(instance)
+        return instance
 
     def validate(self, data):
         if "ingredients" not in data:
@@ -276,9 +337,18 @@ class RecipeWriteSerializer(serializers.ModelSerializer, IsAuthAndExistsMixin):
         ).data
 
 
+class RecipeReadListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        attach_tag_ids(recipes)
+        return super().to_representation(recipes)
+
+
 class RecipeReadSerializer(serializers.ModelSerializer, IsAuthAndExistsMixin):
     image = Base64ImageField()
-    tags = TagsSerializer(many=True, read_only=True)
+    image_thumbnail = Base64ImageField(read_only=True)
+    image_webp = Base64ImageField(read_only=True)
+    tags = CatalogTagsField()
     author = CustomUserSerializer(
         read_only=True,
     )
@@ -291,13 +361,45 @@ class RecipeReadSerializer(serializers.ModelSerializer, IsAuthAndExistsMixin):
 
     class Meta:
         model = Recipe
-        exclude = ("pub_date",)
+        exclude = (
+            "pub_date",
+            "favourites_count",
+            "in_carts_count",
+            "search_vector",
+        )
+        list_serializer_class = RecipeReadListSerializer
 
     def get_is_favorited(self, obj):
-        return self.is_auth_and_exists(obj, FavouriteRecipe)
+        return self.is_auth_and_exists(obj, FavouriteRecipe, "is_favorited")
 
     def get_is_in_shopping_cart(self, obj):
-        return self.is_auth_and_exists(obj, ShoppingCart)
+        return self.is_auth_and_exists(
+            obj, ShoppingCart, "is_in_shopping_cart"
+        )
+
+    def to_representation(self, instance):
+        is_subscribed = getattr(instance, "is_author_subscribed", None)
+        if is_subscribed is not None:
+            instance.author.is_subscribed = is_subscribed
+        return super().to_representation(instance)
+
+
+class ShoppingCartIngredientSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source="ingredient.id")
+    name = serializers.ReadOnlyField(source="ingredient.name")
+    measurement_unit = serializers.ReadOnlyField(
+        source="ingredient.measurement_unit"
+    )
+    amount = serializers.ReadOnlyField(source="total_amount")
+
+    class Meta:
+        model = ShoppingCartIngredient
+        fields = ("id", "name", "measurement_unit", "amount")
+
+
+class RecipeMatchSerializer(RecipeReadSerializer):
+    matched_count = serializers.IntegerField(read_only=True)
+    missing_count = serializers.IntegerField(read_only=True)
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -309,4 +411,22 @@ class IngredientSerializer(serializers.ModelSerializer):
 class ShortRecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = (
+            "id",
+            "name",
+            "image",
+            "image_thumbnail",
+            "image_webp",
+            "cooking_time",
+        )
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_IDS,
+    )
+
+    def validate_ids(self, ids):
+        return list(dict.fromkeys(ids))
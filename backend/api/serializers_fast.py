@@ -0,0 +1,136 @@
+from django.conf import settings
+from recipes.models import FavouriteRecipe, ShoppingCart
+from users.models import Follow
+
+from .catalog import (attach_tag_ids, context_snapshot, ingredient_catalog,
+                      tag_catalog)
+from .fields import media_path
+from .serializers import RecipeMatchSerializer, RecipeReadSerializer
+from .serializers_mixins import IsAuthAndExistsMixin
+
+
+class RecipeReadFastSerializer(IsAuthAndExistsMixin):
+    """Тот же ответ, что у RecipeReadSerializer, без полей DRF.
+
+    Словари рецептов собираются обычными функциями из загруженных
+    объектов, их prefetch и справочников в памяти; ключи и значения
+    совпадают с RecipeReadSerializer, поэтому JSON не отличается ни на
+    байт. Поддерживает только чтение: instance, many, context и data.
+    """
+
+    extra_fields = ()
+
+    def __init__(self, instance=None, many=False, context=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+    @property
+    def data(self):
+        if not self.many:
+            return self.recipe(self.instance, self.prepare((self.instance,)))
+        recipes = list(self.instance)
+        prepared = self.prepare(recipes)
+        return [self.recipe(recipe, prepared) for recipe in recipes]
+
+    def prepare(self, recipes):
+        """Общие для всех рецептов данные, вычисляются один раз."""
+        attach_tag_ids(recipes)
+        return (
+            context_snapshot(self.context, tag_catalog),
+            context_snapshot(self.context, ingredient_catalog),
+            self.context.get("request"),
+        )
+
+    @staticmethod
+    def image(file, request):
+        if not file:
+            return None
+        url = file.storage.url(file.name)
+        if request is not None and "/backend_media" not in url:
+            url = request.build_absolute_uri(url)
+        return media_path(url)
+
+    def author(self, recipe):
+        author = recipe.author
+        is_subscribed = getattr(recipe, "is_author_subscribed", None)
+        if is_subscribed is None:
+            is_subscribed = getattr(author, "is_subscribed", None)
+        if is_subscribed is None:
+            request = self.context.get("request")
+            is_subscribed = bool(
+                request
+                and request.user.is_authenticated
+                and Follow.objects.filter(
+                    user=request.user, author=author
+                ).exists()
+            )
+        return {
+            "id": author.id,
+            "username": author.username,
+            "first_name": author.first_name,
+            "last_name": author.last_name,
+            "email": author.email,
+            "is_subscribed": is_subscribed,
+        }
+
+    @staticmethod
+    def ingredients(recipe, ingredients):
+        rows = []
+        for item in recipe.recipe_ingredients.all():
+            _, name, measurement_unit = ingredient_catalog.get(
+                item.ingredient_id, ingredients
+            )
+            rows.append({
+                "id": item.ingredient_id,
+                "name": name,
+                "measurement_unit": measurement_unit,
+                "amount": item.amount,
+            })
+        return rows
+
+    def recipe(self, recipe, prepared):
+        tags, ingredients, request = prepared
+        data = {
+            "id": recipe.id,
+            "image": self.image(recipe.image, request),
+            "image_thumbnail": self.image(recipe.image_thumbnail, request),
+            "image_webp": self.image(recipe.image_webp, request),
+            "tags": [
+                {"id": pk, "name": name, "color": color, "slug": slug}
+                for pk, name, color, slug in tag_catalog.ordered(
+                    recipe.tag_ids, tags
+                )
+            ],
+            "author": self.author(recipe),
+            "ingredients": self.ingredients(recipe, ingredients),
+            "is_favorited": self.is_auth_and_exists(
+                recipe, FavouriteRecipe, "is_favorited"
+            ),
+            "is_in_shopping_cart": self.is_auth_and_exists(
+                recipe, ShoppingCart, "is_in_shopping_cart"
+            ),
+        }
+        for field in self.extra_fields:
+            data[field] = getattr(recipe, field)
+        data["name"] = recipe.name
+        data["text"] = recipe.text
+        data["cooking_time"] = recipe.cooking_time
+        return data
+
+
+class RecipeMatchFastSerializer(RecipeReadFastSerializer):
+    extra_fields = ("matched_count", "missing_count")
+
+
+FAST_SERIALIZERS = {
+    RecipeReadSerializer: RecipeReadFastSerializer,
+    RecipeMatchSerializer: RecipeMatchFastSerializer,
+}
+
+
+def read_serializer(serializer_class):
+    """Быстрая замена сериализатора чтения при RECIPE_FAST_SERIALIZER."""
+    if settings.RECIPE_FAST_SERIALIZER:
+        return FAST_SERIALIZERS.get(serializer_class, serializer_class)
+    return serializer_class
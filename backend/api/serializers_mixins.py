@@ -1,7 +1,10 @@
 
 
 class IsAuthAndExistsMixin:
-    def is_auth_and_exists(self, obj, model):
+    def is_auth_and_exists(self, obj, model, annotation=None):
+        annotated = getattr(obj, annotation, None) if annotation else None
+        if annotated is not None:
+            return annotated
         request = self.context.get("request")
         if request and request.user.is_authenticated:
             return model.objects.filter(recipe=obj, user=request.user).exists()
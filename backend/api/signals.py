@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.signals import (models_changed, recipe_counter_changed,
+                             recipe_ingredients_changed)
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_tokens
+from .cache import (bump_generation_on_commit, counter_generation_name,
+                    generation_name)
+from .recipe_matcher import invalidate_recipe_matcher, log_recipe_changes
+
+User = get_user_model()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver(recipe_ingredients_changed, sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_model_generation(sender, **kwargs):
+    bump_generation_on_commit(generation_name(sender))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=RecipeIngredient)
+def bump_recipe_generation(sender, action, **kwargs):
+    if action.startswith("post_"):
+        bump_generation_on_commit(generation_name(Recipe))
+
+
+@receiver(models_changed)
+def bump_changed_generation(sender, **kwargs):
+    bump_generation_on_commit(generation_name(sender))
+
+
+@receiver(recipe_counter_changed, sender=Recipe)
+def bump_counter_generation(sender, field, **kwargs):
+    bump_generation_on_commit(counter_generation_name(sender, field))
+
+
+@receiver((post_save, post_delete), sender=User)
+def bump_user_generation(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    bump_generation_on_commit(generation_name(User))
+
+
+@receiver(recipe_ingredients_changed, sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def log_recipe_ingredients(sender, recipe=None, instance=None, **kwargs):
+    recipe_id = recipe.pk if recipe is not None else instance.recipe_id
+    transaction.on_commit(lambda: log_recipe_changes(recipe_id))
+
+
+@receiver(models_changed, sender=RecipeIngredient)
+def rebuild_recipe_matcher(sender, **kwargs):
+    transaction.on_commit(invalidate_recipe_matcher)
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    transaction.on_commit(lambda: forget_tokens(instance.key))
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, created, update_fields=None,
+                       **kwargs):
+    if created or (update_fields and set(update_fields) <= {"last_login"}):
+        return
+    keys = list(Token.objects.filter(user=instance).values_list(
+        "key", flat=True
+    ))
+    transaction.on_commit(lambda: forget_tokens(*keys))
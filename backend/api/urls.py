@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from .async_views import async_patterns
 from .views import (CustomUserViewSet, IngredientsVewSet, RecipeViewSet,
                     TagsViewSet)
 
@@ -13,5 +14,5 @@ router.register("users", CustomUserViewSet, basename="users")
 router.register("ingredients", IngredientsVewSet)
 
 urlpatterns = [
-    path("", include(router.urls)),
+    path("", include(async_patterns(router.urls))),
 ]
@@ -1,51 +1,153 @@
-from io import BytesIO
-
 from django.contrib.auth import get_user_model
-from django.db.models.aggregates import Sum
-from django.http import FileResponse
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from recipes.models import (FavouriteRecipe, Ingredient, Recipe,
+from recipes.cart import (cart_users, change_cart_ingredients, recipe_amounts,
+                          recipes_amounts)
+from recipes.counters import RECIPE_COUNTERS, change_user_counter
+from recipes.feed import read_feed
+from recipes.models import (FavouriteRecipe, FeedEntry, Ingredient, Recipe,
                             RecipeIngredient, ShoppingCart, Tag)
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
+from recipes.toggles import (add_follows, add_recipe, add_recipes,
+                             remove_follows, remove_recipe, remove_recipes)
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from users.models import Follow
 
-from .filters import IngredientFilter, RecipeFilter
-from .pagination import CustomPageNumberPagination
+from .cache import counter_generation_name
+from .catalog import ingredient_catalog, tag_catalog
+from .exporters import EXPORTERS, shopping_cart_ingredients
+from .filters import ORDERINGS, IngredientFilter, RecipeFilter
+from .ingredient_index import ingredient_index
+from .pagination import (CustomPageNumberPagination, FeedPagination,
+                         MatchPagination)
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (CreateSubscribeSerializer, IngredientSerializer,
-                          RecipeReadSerializer, RecipeWriteSerializer,
+from .recipe_matcher import recipe_matcher
+from .renderers import SHOPPING_CART_RENDERERS, use_json_for_errors
+from .serializers import (BulkIdsSerializer, IngredientSerializer,
+                          RecipeMatchSerializer, RecipeReadSerializer,
+                          RecipeWriteSerializer,
+                          ShoppingCartIngredientSerializer,
                           ShortRecipeSerializer, SubscriptionSerializer,
                           TagsSerializer)
+from .serializers_fast import read_serializer
+from .views_mixins import CachedResponseMixin, CatalogViewMixin
 
 User = get_user_model()
 
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+def bulk_response(ids, done, existing, done_status, missing, failed,
+                  rejected=None):
+    """Ответ */bulk/: для каждого id — код, как у одиночного запроса."""
+    rejected = rejected or {}
+    results = []
+    for pk in ids:
+        if pk in done:
+            results.append({"id": pk, "status": done_status})
+        elif pk in rejected:
+            results.append({
+                "id": pk,
+                "status": status.HTTP_400_BAD_REQUEST,
+                "errors": rejected[pk],
+            })
+        elif pk in existing:
+            results.append({
+                "id": pk,
+                "status": status.HTTP_400_BAD_REQUEST,
+                "errors": failed,
+            })
+        else:
+            results.append({
+                "id": pk,
+                "status": status.HTTP_404_NOT_FOUND,
+                "errors": missing,
+            })
+    return Response({"results": results})
+
+
+def bulk_ids(request):
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data["ids"]
+
+
+class TagsViewSet(
+    CachedResponseMixin, CatalogViewMixin, viewsets.ReadOnlyModelViewSet
+):
     queryset = Tag.objects.all()
+    cache_models = (Tag,)
+    catalog = tag_catalog
     serializer_class = TagsSerializer
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
+    cache_models = (Recipe, RecipeIngredient, Tag, Ingredient, User)
     permission_classes = (IsAuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     pagination_class = CustomPageNumberPagination
 
+    def cache_generations(self):
+        """Сортировка по счётчику зависит и от его поколения."""
+        ordering = ORDERINGS.get(self.request.query_params.get("ordering"))
+        return super().cache_generations() + [
+            counter_generation_name(Recipe, field.lstrip("-"))
+            for field in ordering or ()
+            if field.lstrip("-") in RECIPE_COUNTERS.values()
+        ]
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        use_json_for_errors(request, response)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def get_queryset(self):
+        queryset = Recipe.objects.select_related("author").prefetch_related(
+            "recipe_ingredients"
+        )
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(
+                    FavouriteRecipe.objects.filter(
+                        user=user, recipe=OuterRef("pk")
+                    )
+                ),
+                is_in_shopping_cart=Exists(
+                    ShoppingCart.objects.filter(
+                        user=user, recipe=OuterRef("pk")
+                    )
+                ),
+                is_author_subscribed=Exists(
+                    Follow.objects.filter(
+                        user=user, author=OuterRef("author")
+                    )
+                ),
+            )
+        return queryset
+
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        change_user_counter(self.request.user.id, "recipes_count", 1)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        change_cart_ingredients(
+            cart_users(instance.id), recipe_amounts(instance.id, -1)
+        )
+        instance.delete()
+        change_user_counter(instance.author_id, "recipes_count", -1)
 
     def get_serializer_class(self):
         if self.request.method in permissions.SAFE_METHODS:
-            return RecipeReadSerializer
+            return read_serializer(RecipeReadSerializer)
         return RecipeWriteSerializer
 
     @action(
@@ -68,86 +170,197 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return self.add_to(ShoppingCart, request.user, pk)
         return self.delete_from(ShoppingCart, request.user, pk)
 
+    @action(
+        detail=False,
+        methods=["post", "delete"],
+        permission_classes=(IsAuthenticated,),
+        url_path="favorite/bulk",
+    )
+    def favorite_bulk(self, request):
+        return self.bulk_change(FavouriteRecipe, request)
+
+    @action(
+        detail=False,
+        methods=["post", "delete"],
+        permission_classes=(IsAuthenticated,),
+        url_path="shopping_cart/bulk",
+    )
+    def shopping_cart_bulk(self, request):
+        return self.bulk_change(ShoppingCart, request)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=(IsAuthenticated,),
+        url_path="shopping_cart",
+        url_name="shopping_cart_summary",
+    )
+    def shopping_cart_summary(self, request):
+        ingredients = request.user.shopping_cart_ingredients.select_related(
+            "ingredient"
+        ).order_by("ingredient__name", "ingredient__measurement_unit")
+        serializer = ShoppingCartIngredientSerializer(ingredients, many=True)
+        return Response(serializer.data)
+
     @action(
         detail=False,
         methods=["get"],
-        permission_classes=(IsAuthenticated,)
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=SHOPPING_CART_RENDERERS,
     )
     def download_shopping_cart(self, request):
-        pdfmetrics.registerFont(
-            TTFont("DejaVuSans", "/app/font/DejaVuSans.ttf")
+        # Клиентам, запросившим JSON, как и раньше отдаётся PDF.
+        exporter = EXPORTERS.get(
+            request.accepted_renderer.format, EXPORTERS["pdf"]
+        )
+        return exporter(
+            shopping_cart_ingredients(request.user)
+        ).response("shopping_cart")
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedPagination,
+    )
+    def feed(self, request):
+        rows = self.paginator.paginate_feed(
+            request,
+            lambda limit, after: read_feed(request.user.id, limit, after),
+            FeedEntry.objects.all(),
+        )
+        recipes = self.get_queryset().in_bulk(
+            [row.recipe_id for row in rows]
         )
-        pdfmetrics.registerFont(
-            TTFont("DejaVuSans-Bold", "/app/font/DejaVuSans-Bold.ttf")
+        serializer = self.get_serializer(
+            [
+                recipes[row.recipe_id]
+                for row in rows
+                if row.recipe_id in recipes
+            ],
+            many=True,
         )
+        return self.paginator.get_paginated_response(serializer.data)
 
-        recipes = (
-            RecipeIngredient.objects.filter(
-                recipe__shopping_cart__user=request.user
+    @action(
+        detail=False, methods=["get"], pagination_class=MatchPagination
+    )
+    def match(self, request):
+        ingredients = request.query_params.get("ingredients", "").split(",")
+        if not all(pk.strip().isdigit() for pk in ingredients):
+            return Response(
+                {"errors": "Укажите id ингредиентов через запятую."},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-            .values("ingredient__name", "ingredient__measurement_unit")
-            .annotate(sum_total=Sum("amount"))
+        results = self.paginate_queryset(
+            recipe_matcher.match(int(pk) for pk in ingredients)
         )
-        if recipes:
-            buffer = BytesIO()
-            pdf = canvas.Canvas(buffer)
-            pdf.setFont("DejaVuSans-Bold", 16)
-            pdf.drawString(200, 800, "Список покупок:")
-            y_position = 750
-            pdf.setFont("DejaVuSans", 12)
-            for index, ingredient in enumerate(recipes, start=1):
-                text = (
-                    f"{index}. "
-                    f'{ingredient["ingredient__name"]} '
-                    f'{ingredient["sum_total"]} '
-                    f'{ingredient["ingredient__measurement_unit"]}.'
-                )
-                pdf.drawString(200, y_position, text)
-                y_position -= 20
-            pdf.save()
-            buffer.seek(0)
-#        buffer = BytesIO()
-        response = FileResponse(
-            buffer, as_attachment=True, filename="shopping_cart.pdf"
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in results]
         )
-        return response
+        page = []
+        for recipe_id, matched, missing in results:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.matched_count = matched
+            recipe.missing_count = missing
+            page.append(recipe)
+        serializer = read_serializer(RecipeMatchSerializer)(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
 
     @staticmethod
     def add_to(model, user, pk):
-        if model.objects.filter(user=user, recipe__id=pk).exists():
+        recipe = None
+        if str(pk).isdigit():
+            with transaction.atomic():
+                recipe, added = add_recipe(model, user.id, pk)
+                if added and model is ShoppingCart:
+                    change_cart_ingredients(
+                        (user.id,), recipe_amounts(recipe.id)
+                    )
+        if recipe is None:
             return Response(
-                {"errors": "Рецепт уже добавлен."},
+                {"errors": "Такого рецепта не существует."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        if not Recipe.objects.filter(id=pk).exists():
+        if not added:
             return Response(
-                {"errors": "Такого рецепта не существует."},
+                {"errors": "Рецепт уже добавлен."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
         serializer = ShortRecipeSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @staticmethod
     def delete_from(model, user, pk) -> Response:
-        recipe = get_object_or_404(Recipe, pk=pk)
-        obj = model.objects.filter(user=user, recipe=recipe)
-        if obj.exists():
-            obj.delete()
+        if not str(pk).isdigit():
+            raise Http404
+        with transaction.atomic():
+            deleted = remove_recipe(model, user.id, pk)
+            if deleted and model is ShoppingCart:
+                change_cart_ingredients(
+                    (user.id,), recipe_amounts(pk, -deleted)
+                )
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(Recipe, pk=pk)
         return Response(
             {"errors": "Нет такого рецепта."},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
+    @staticmethod
+    def bulk_change(model, request):
+        ids = bulk_ids(request)
+        user = request.user
+        if request.method == "POST":
+            with transaction.atomic():
+                recipes, added = add_recipes(model, user.id, ids)
+                if added and model is ShoppingCart:
+                    change_cart_ingredients(
+                        (user.id,), recipes_amounts(added)
+                    )
+            return bulk_response(
+                ids, added, recipes, status.HTTP_201_CREATED,
+                "Такого рецепта не существует.", "Рецепт уже добавлен.",
+            )
+        with transaction.atomic():
+            removed = remove_recipes(model, user.id, ids)
+            if removed and model is ShoppingCart:
+                change_cart_ingredients(
+                    (user.id,), recipes_amounts(removed, -1)
+                )
+        failed = set(ids) - removed
+        existing = set(Recipe.objects.filter(pk__in=failed).values_list(
+            "pk", flat=True
+        )) if failed else set()
+        return bulk_response(
+            ids, removed, existing, status.HTTP_204_NO_CONTENT,
+            "Такого рецепта не существует.", "Нет такого рецепта.",
+        )
+
 
-class IngredientsVewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsVewSet(
+    CachedResponseMixin, CatalogViewMixin, viewsets.ReadOnlyModelViewSet
+):
     queryset = Ingredient.objects.all()
+    cache_models = (Ingredient,)
+    catalog = ingredient_catalog
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get("name")
+        if not name:
+            return super().list(request, *args, **kwargs)
+        limit = request.query_params.get("limit")
+        limit = int(limit) if limit and limit.isdigit() else None
+        return Response(ingredient_index.search(name, limit))
+
 
 class CustomUserViewSet(UserViewSet):
     queryset = User.objects.all()
@@ -161,9 +374,27 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         user = self.request.user
-        user_subscriptions = user.follower.all()
-        authors = user_subscriptions.values_list('author_id', flat=True)
-        queryset = User.objects.filter(pk__in=authors)
+        recipes = Recipe.objects.order_by("-pub_date")
+        limit = request.query_params.get("recipes_limit")
+        if limit and limit.isdigit():
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(author=OuterRef("author"))
+                .order_by("-pub_date")
+                .values("pk")[:int(limit)]
+            ))
+        queryset = (
+            User.objects.filter(following__user=user)
+            .annotate(
+                recipes_count=Coalesce(F("stats__recipes_count"), 0),
+                is_subscribed=Exists(
+                    Follow.objects.filter(user=user, author=OuterRef("pk"))
+                ),
+            )
+            .prefetch_related(
+                Prefetch("recipes", queryset=recipes, to_attr="preview")
+            )
+            .order_by("id")
+        )
         paginated_queryset = self.paginate_queryset(queryset)
         serializer = self.get_serializer(paginated_queryset, many=True)
         return self.get_paginated_response(serializer.data)
@@ -176,26 +407,66 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscribe(self, request, id=None):
         user = self.request.user
-        author = get_object_or_404(User, pk=id)
         if self.request.method == "POST":
-            serializer = CreateSubscribeSerializer(
-                data={'author': author.id, 'user': user.id},
-                context={"request": request})
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
+            author = get_object_or_404(User, pk=id)
+            if author == user:
+                return Response(
+                    {"errors": "Нельзя подписаться на себя."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            with transaction.atomic():
+                _, added = add_follows(user.id, (author.id,))
+            if not added:
+                return Response(
+                    {"errors": "Вы уже подписаны."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
             serializer = SubscriptionSerializer(
                 author, context={"request": request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        subscription = Follow.objects.filter(
-            user=request.user, author=id)
-        if subscription.exists():
-            subscription.delete()
+        deleted = False
+        if str(id).isdigit():
+            with transaction.atomic():
+                deleted = remove_follows(user.id, (int(id),))
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(User, pk=id)
         return Response(
             {'error': 'Нет подписки для удаления.'},
             status=status.HTTP_400_BAD_REQUEST)
 
+    @action(
+        detail=False,
+        methods=("post", "delete"),
+        permission_classes=(permissions.IsAuthenticated,),
+        url_path="subscribe/bulk",
+    )
+    def subscribe_bulk(self, request):
+        ids = bulk_ids(request)
+        user = request.user
+        if request.method == "POST":
+            rejected = {user.id: "Нельзя подписаться на себя."}
+            with transaction.atomic():
+                authors, added = add_follows(
+                    user.id, (pk for pk in ids if pk != user.id)
+                )
+            return bulk_response(
+                ids, added, authors, status.HTTP_201_CREATED,
+                "Такого пользователя не существует.", "Вы уже подписаны.",
+                rejected,
+            )
+        with transaction.atomic():
+            removed = remove_follows(user.id, ids)
+        failed = set(ids) - removed
+        existing = set(User.objects.filter(pk__in=failed).values_list(
+            "pk", flat=True
+        )) if failed else set()
+        return bulk_response(
+            ids, removed, existing, status.HTTP_204_NO_CONTENT,
+            "Такого пользователя не существует.", "Нет подписки для удаления.",
+        )
+
     @action(
         detail=False,
         methods=("get",),
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+from django.utils.http import parse_etags
+from foodgram.db_routers import read_from_primary
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cache import RESPONSE_KEY, generation_name, response_digest
+
+
+class CachedResponseMixin:
+    """Кэширование list и retrieve для анонимных пользователей.
+
+    Ключ зависит от поколений моделей из cache_models (и других, которые
+    добавляет cache_generations), поэтому после изменения любой из них
+    старые ответы больше не выдаются.
+    """
+
+    cache_models = ()
+
+    def cache_generations(self):
+        return [generation_name(model) for model in self.cache_models]
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        digest = response_digest(request, self.cache_generations())
+        etag = f'"{digest}"'
+        if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
+        key = RESPONSE_KEY.format(digest)
+        data = cache.get(key)
+        if data is None:
+            read_from_primary()
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(key, response.data, settings.API_CACHE_TIMEOUT)
+        else:
+            response = Response(data)
+        response["ETag"] = etag
+        return response
+
+
+class CatalogViewMixin:
+    """list и retrieve справочной модели из catalog без запросов к базе."""
+
+    catalog = None
+
+    def list(self, request, *args, **kwargs):
+        return Response(self.catalog.as_dicts())
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        row = self.catalog.get(int(pk)) if str(pk).isdigit() else None
+        if row is None:
+            raise Http404
+        return Response(self.catalog.as_dict(row))
@@ -1,8 +1,14 @@
 #!/bin/sh
 
 python manage.py makemigrations
+python manage.py dedupe_follows
 python manage.py migrate
 python manage.py collectstatic --no-input
 cp -r /app/static/. /backend_static/
 
-gunicorn foodgram.wsgi:application --bind 0.0.0.0:8000
\ No newline at end of file
+if [ "$SERVER_MODE" = "asgi" ]; then
+    gunicorn foodgram.asgi:application --bind 0.0.0.0:8000 \
+        --worker-class uvicorn.workers.UvicornWorker
+else
+    gunicorn foodgram.wsgi:application --bind 0.0.0.0:8000
+fi
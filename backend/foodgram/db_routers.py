@@ -0,0 +1,123 @@
+import asyncio
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+class RoutingState:
+    """Выбор базы в пределах одного запроса.
+
+    Объект изменяется на месте, поэтому изменения видны и из потоков, в
+    которые контекст запроса скопирован (ASGI).
+    """
+
+    def __init__(self):
+        self.replica = None
+        self.pinned = False
+
+
+routing_state = ContextVar("routing_state", default=None)
+
+
+def check_connections(**kwargs):
+    """Закрывает сохранённые соединения, которые перестали отвечать."""
+    for connection in connections.all():
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
+
+
+def read_from_primary():
+    """До конца запроса читать из основной базы.
+
+    Нужно там, где прочитанное сохраняется в кэше под текущим поколением:
+    отстающая реплика вернула бы строки до изменения, которое это
+    поколение уже учитывает.
+    """
+    state = routing_state.get()
+    if state is not None:
+        state.replica = None
+
+
+class ReplicaRouter:
+    """Чтение из реплик для view из REPLICA_VIEWS.
+
+    Реплика выбирается один раз на запрос. После первой записи запрос до
+    конца работает с основной базой, чтобы читать свои изменения. Ответы,
+    которые попадут в кэш, тоже читаются из основной базы.
+    """
+
+    @staticmethod
+    def db_for_read(model, **hints):
+        state = routing_state.get()
+        if state is None or state.pinned:
+            return None
+        return state.replica
+
+    @staticmethod
+    def db_for_write(model, **hints):
+        state = routing_state.get()
+        if state is not None:
+            state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    @staticmethod
+    def allow_relation(obj1, obj2, **hints):
+        return True
+
+    @staticmethod
+    def allow_migrate(db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """Включает чтение из реплики для безопасных запросов к REPLICA_VIEWS.
+
+    Ключи REPLICA_VIEWS — имя ViewSet или «ViewSet.action».
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DB_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Так Django распознаёт асинхронный middleware.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = routing_state.set(RoutingState())
+        try:
+            return self.get_response(request)
+        finally:
+            routing_state.reset(token)
+
+    async def __acall__(self, request):
+        token = routing_state.set(RoutingState())
+        try:
+            return await self.get_response(request)
+        finally:
+            routing_state.reset(token)
+
+    @staticmethod
+    def process_view(request, view_func, view_args, view_kwargs):
+        state = routing_state.get()
+        view_class = getattr(view_func, "cls", None)
+        if (
+            state is None
+            or view_class is None
+            or request.method not in SAFE_METHODS
+        ):
+            return
+        actions = getattr(view_func, "actions", None) or {}
+        action = actions.get(request.method.lower(), request.method.lower())
+        name = view_class.__name__
+        if {name, f"{name}.{action}"} & settings.REPLICA_VIEWS:
+            state.replica = random.choice(settings.DB_REPLICAS)
@@ -27,6 +27,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework.authtoken",
     "rest_framework",
     "django_filters",
@@ -38,6 +39,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.QueryInstrumentationMiddleware",
+    "foodgram.db_routers.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -68,6 +71,11 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "foodgram.wsgi.application"
 
+# wsgi или asgi: под ASGI читающие запросы API выполняются в пуле потоков,
+# у каждого потока своё соединение с базой.
+SERVER_MODE = os.getenv("SERVER_MODE", "wsgi")
+ASGI_READ_THREADS = int(os.getenv("ASGI_READ_THREADS", 16))
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -76,9 +84,38 @@ DATABASES = {
         "PASSWORD": os.getenv("POSTGRES_PASSWORD", ""),
         "HOST": os.getenv("DB_HOST", ""),
         "PORT": os.getenv("DB_PORT", 5432),
+        "CONN_MAX_AGE": int(os.getenv("CONN_MAX_AGE", 60)),
     }
 }
 
+# Проверять сохранённые соединения в начале каждого запроса.
+CONN_HEALTH_CHECKS = os.getenv("CONN_HEALTH_CHECKS") == "TRUE"
+
+# Реплики для чтения: адреса через пробел, "host" или "host:port".
+for index, address in enumerate(
+    os.getenv("DB_REPLICA_HOSTS", "").split(), start=1
+):
+    host, _, port = address.partition(":")
+    DATABASES[f"replica{index}"] = dict(
+        DATABASES["default"],
+        HOST=host,
+        PORT=port or DATABASES["default"]["PORT"],
+        TEST={"MIRROR": "default"},
+    )
+
+DB_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+
+DATABASE_ROUTERS = ["foodgram.db_routers.ReplicaRouter"]
+
+# Безопасные запросы к этим ViewSet (или ViewSet.action) читают из реплик.
+REPLICA_VIEWS = {
+    "RecipeViewSet",
+    "IngredientsVewSet",
+    "TagsViewSet",
+    "CustomUserViewSet.list",
+    "CustomUserViewSet.subscriptions",
+}
+
 # DATABASES = {
 #    'default': {
 #        "ENGINE": 'django.db.backends.sqlite3',
@@ -88,6 +125,24 @@ DATABASES = {
 #    }
 # }
 
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
+API_CACHE_TIMEOUT = int(os.getenv("API_CACHE_TIMEOUT", 60 * 15))
+
+# Авторы с большим числом подписчиков не раскладывают рецепты по лентам,
+# их рецепты читаются при запросе ленты.
+FEED_FANOUT_LIMIT = int(os.getenv("FEED_FANOUT_LIMIT", 1000))
+
+# Конфигурация полнотекстового поиска PostgreSQL (стемминг)
+SEARCH_CONFIG = os.getenv("SEARCH_CONFIG", "russian")
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation."
@@ -121,20 +176,81 @@ STATICFILES_DIR = [
     os.path.join(BASE_DIR, "font")
 ]
 
+FONTS_DIR = os.path.join(BASE_DIR, "font")
+
 STATIC_URL = "/backend_static/"
 STATIC_ROOT = os.path.join(BASE_DIR, "backend_static")
 
 MEDIA_URL = "/backend_media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+IMAGE_MAX_UPLOAD_SIZE = int(
+    os.getenv("IMAGE_MAX_UPLOAD_SIZE", 10 * 1024 * 1024)
+)
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", 6000))
+IMAGE_THUMBNAIL_SIZE = (480, 480)
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+BULK_MAX_IDS = int(os.getenv("BULK_MAX_IDS", 100))
+
+# Ответы с рецептами собираются без полей DRF; FALSE возвращает
+# RecipeReadSerializer.
+RECIPE_FAST_SERIALIZER = os.getenv("RECIPE_FAST_SERIALIZER", "TRUE") == "TRUE"
+
+QUERY_INSTRUMENTATION = os.getenv("QUERY_INSTRUMENTATION") == "TRUE"
+
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT") == "TRUE"
+
+# Максимум SQL-запросов на view.action, включая проверку токена.
+QUERY_BUDGETS = {
+    "TagsViewSet.list": 2,
+    "TagsViewSet.retrieve": 2,
+    "IngredientsVewSet.list": 2,
+    "IngredientsVewSet.retrieve": 2,
+    "RecipeViewSet.list": 5,
+    "RecipeViewSet.retrieve": 4,
+    "RecipeViewSet.download_shopping_cart": 2,
+    "RecipeViewSet.shopping_cart_summary": 2,
+    "RecipeViewSet.match": 5,
+    "RecipeViewSet.feed": 5,
+    "CustomUserViewSet.subscriptions": 4,
+    "CustomUserViewSet.me": 2,
+    "RecipeViewSet.favorite_bulk": 3,
+    "RecipeViewSet.shopping_cart_bulk": 7,
+    "CustomUserViewSet.subscribe_bulk": 7,
+}
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "api.queries": {"handlers": ["console"], "level": "INFO"},
+    },
+}
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ],
 }
 
+# Кэш проверенных токенов: время жизни записи, размер кэша в памяти
+# процесса и хранение в общем кэше Django вместо памяти процесса.
+# Записи сверяются с поколениями в кэше Django, поэтому при нескольких
+# процессах gunicorn (WEB_CONCURRENCY) и LocMemCache кэш токенов выключен.
+TOKEN_CACHE = os.getenv("TOKEN_CACHE", "TRUE") == "TRUE" and not (
+    CACHES["default"]["BACKEND"].endswith("LocMemCache")
+    and int(os.getenv("WEB_CONCURRENCY", 1)) > 1
+)
+TOKEN_CACHE_TIMEOUT = int(os.getenv("TOKEN_CACHE_TIMEOUT", 60))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+TOKEN_CACHE_SHARED = os.getenv("TOKEN_CACHE_SHARED") == "TRUE"
+
 DJOSER = {
     "LOGIN_FIELD": "email",
     "SERIALIZERS": {
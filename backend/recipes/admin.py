@@ -1,8 +1,10 @@
 from django.contrib import admin
 from import_export.admin import ImportExportMixin
 
+from .cart import amounts_difference, recipe_amounts, update_recipe_carts
 from .models import (FavouriteRecipe, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Tag)
+                     ShoppingCart, ShoppingCartIngredient, Tag)
+from .signals import recipe_ingredients_changed
 
 
 class RecipeIngredientAdmin(admin.StackedInline):
@@ -30,9 +32,18 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = (RecipeIngredientAdmin,)
     empty_value_display = "пусто"
 
-    @admin.display(description="В избранном")
+    @admin.display(description="В избранном", ordering="favourites_count")
     def get_favorite_count(self, obj):
-        return obj.favourite.count()
+        return obj.favourites_count
+
+    def save_related(self, request, form, formsets, change):
+        old_amounts = recipe_amounts(form.instance.pk) if change else None
+        super().save_related(request, form, formsets, change)
+        if change:
+            update_recipe_carts(form.instance.pk, amounts_difference(
+                old_amounts, recipe_amounts(form.instance.pk)
+            ))
+        recipe_ingredients_changed.send(sender=Recipe, recipe=form.instance)
 
 
 @admin.register(Tag)
@@ -84,3 +95,11 @@ class ShoppingCartAdmin(admin.ModelAdmin):
         "recipe__name",
     )
     empty_value_display = "пусто"
+
+
+@admin.register(ShoppingCartIngredient)
+class ShoppingCartIngredientAdmin(admin.ModelAdmin):
+    list_display = ("user", "ingredient", "total_amount")
+    list_select_related = ("user", "ingredient")
+    search_fields = ("user__username", "ingredient__name")
+    empty_value_display = "пусто"
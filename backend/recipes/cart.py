@@ -0,0 +1,121 @@
+from django.db.models import Case, IntegerField, Sum, Value, When
+
+from .counters import shift
+from .models import RecipeIngredient, ShoppingCart, ShoppingCartIngredient
+
+
+def recipes_amounts(recipe_ids, factor=1):
+    """Суммарное количество каждого ингредиента рецептов, умноженное на
+    factor."""
+    return {
+        ingredient_id: amount * factor
+        for ingredient_id, amount in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        )
+        .values("ingredient_id")
+        .annotate(amount=Sum("amount"))
+        .values_list("ingredient_id", "amount")
+    }
+
+
+def recipe_amounts(recipe_id, factor=1):
+    """Количество каждого ингредиента рецепта, умноженное на factor."""
+    return recipes_amounts((recipe_id,), factor)
+
+
+def cart_users(recipe_id):
+    return list(
+        ShoppingCart.objects.filter(recipe_id=recipe_id).values_list(
+            "user_id", flat=True
+        )
+    )
+
+
+def change_cart_ingredients(user_ids, deltas):
+    """Прибавляет deltas ({id ингредиента: количество}) к спискам покупок.
+
+    Не более трёх запросов при любом числе ингредиентов: недостающие строки
+    создаются с нулём, все суммы меняются одним UPDATE, обнулившиеся
+    строки удаляются.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not user_ids or not deltas:
+        return
+    ShoppingCartIngredient.objects.bulk_create(
+        [
+            ShoppingCartIngredient(
+                user_id=user_id, ingredient_id=ingredient_id, total_amount=0
+            )
+            for user_id in user_ids
+            for ingredient_id, delta in deltas.items()
+            if delta > 0
+        ],
+        ignore_conflicts=True,
+    )
+    rows = ShoppingCartIngredient.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=deltas
+    )
+    rows.update(total_amount=shift("total_amount", Case(
+        *(
+            When(ingredient_id=ingredient_id, then=Value(delta))
+            for ingredient_id, delta in deltas.items()
+        ),
+        output_field=IntegerField(),
+    )))
+    rows.filter(total_amount=0).delete()
+
+
+def amounts_difference(old_amounts, new_amounts):
+    return {
+        ingredient_id: (
+            new_amounts.get(ingredient_id, 0)
+            - old_amounts.get(ingredient_id, 0)
+        )
+        for ingredient_id in old_amounts.keys() | new_amounts.keys()
+    }
+
+
+def update_recipe_carts(recipe_id, deltas):
+    """После изменения состава рецепта переносит разницу в его корзины."""
+    if any(deltas.values()):
+        change_cart_ingredients(cart_users(recipe_id), deltas)
+
+
+def reconcile_cart_ingredients():
+    """Сверяет агрегат списков покупок с корзинами, возвращает число правок."""
+    actual = {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in RecipeIngredient.objects.filter(
+            recipe__shopping_cart__isnull=False
+        )
+        .values("recipe__shopping_cart__user", "ingredient")
+        .annotate(total=Sum("amount"))
+        .values_list("recipe__shopping_cart__user", "ingredient", "total")
+    }
+    stored = {
+        (user_id, ingredient_id): (pk, total)
+        for pk, user_id, ingredient_id, total in (
+            ShoppingCartIngredient.objects.values_list(
+                "pk", "user_id", "ingredient_id", "total_amount"
+            )
+        )
+    }
+    stale = [
+        pk for key, (pk, _) in stored.items() if not actual.get(key)
+    ]
+    changed = [
+        ShoppingCartIngredient(pk=pk, total_amount=actual[key])
+        for key, (pk, total) in stored.items()
+        if actual.get(key) and actual[key] != total
+    ]
+    missing = [
+        ShoppingCartIngredient(
+            user_id=user_id, ingredient_id=ingredient_id, total_amount=total
+        )
+        for (user_id, ingredient_id), total in actual.items()
+        if total and (user_id, ingredient_id) not in stored
+    ]
+    ShoppingCartIngredient.objects.filter(pk__in=stale).delete()
+    ShoppingCartIngredient.objects.bulk_update(changed, ("total_amount",))
+    ShoppingCartIngredient.objects.bulk_create(missing)
+    return len(stale) + len(changed) + len(missing)
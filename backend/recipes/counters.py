@@ -0,0 +1,57 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from users.models import UserStats
+
+from .models import FavouriteRecipe, Recipe, ShoppingCart
+from .signals import recipe_counter_changed
+
+RECIPE_COUNTERS = {
+    FavouriteRecipe: "favourites_count",
+    ShoppingCart: "in_carts_count",
+}
+
+
+def shift(field, delta):
+    return Greatest(F(field) + delta, 0)
+
+
+def send_counter_changed(model):
+    recipe_counter_changed.send(sender=Recipe, field=RECIPE_COUNTERS[model])
+
+
+def change_recipe_counter(model, recipe_ids, delta):
+    """Атомарно меняет счётчик рецептов для связи model (избранное/корзина)."""
+    if not delta or not recipe_ids:
+        return
+    field = RECIPE_COUNTERS[model]
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        **{field: shift(field, delta)}
+    )
+    send_counter_changed(model)
+
+
+def change_user_counter(user_id, field, delta):
+    """Атомарно меняет счётчик пользователя, создавая запись при нужде."""
+    if not delta:
+        return
+    stats = UserStats.objects.filter(user_id=user_id)
+    if stats.update(**{field: shift(field, delta)}):
+        return
+    _, created = UserStats.objects.get_or_create(
+        user_id=user_id, defaults={field: max(delta, 0)}
+    )
+    if not created:
+        stats.update(**{field: shift(field, delta)})
+
+
+def change_users_counter(user_ids, field, delta):
+    """Меняет счётчик сразу у нескольких пользователей за два запроса."""
+    if not delta or not user_ids:
+        return
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+    UserStats.objects.filter(user_id__in=user_ids).update(
+        **{field: shift(field, delta)}
+    )
@@ -0,0 +1,163 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Exists, F, OuterRef, Q
+from users.models import Follow, UserStats
+
+from .models import FeedEntry, Recipe
+
+ORDERING = ("-pub_date", "-recipe_id")
+BATCH_SIZE = 1000
+
+
+def pulled_authors(author_ids):
+    """Рецепты авторов с большим числом подписчиков не раскладываются по
+    лентам, а читаются при запросе ленты."""
+    return set(UserStats.objects.filter(
+        user_id__in=author_ids,
+        followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).values_list("user_id", flat=True))
+
+
+def is_pulled(author_id):
+    return bool(pulled_authors((author_id,)))
+
+
+def add_entries(pairs):
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for user_id, recipe_id, author_id, pub_date in pairs
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out(recipe):
+    """Новый рецепт в ленты подписчиков автора."""
+    if is_pulled(recipe.author_id):
+        return
+    add_entries(
+        (user_id, recipe.pk, recipe.author_id, recipe.pub_date)
+        for user_id in Follow.objects.filter(
+            author_id=recipe.author_id
+        ).values_list("user_id", flat=True)
+    )
+
+
+def backfill(user_id, *author_ids):
+    """После подписки в ленту попадают уже опубликованные рецепты."""
+    authors = set(author_ids) - pulled_authors(author_ids)
+    if not authors:
+        return
+    add_entries(
+        (user_id, recipe_id, author_id, pub_date)
+        for recipe_id, author_id, pub_date in Recipe.objects.filter(
+            author_id__in=authors
+        ).values_list("pk", "author_id", "pub_date")
+    )
+
+
+def trim(user_id, *author_ids):
+    FeedEntry.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).delete()
+
+
+def read_feed(user_id, limit, after=None):
+    """Страница ленты: строки (pub_date, recipe_id), новые первыми.
+
+    Один запрос: записи ленты UNION рецепты авторов, которые читаются при
+    запросе (pulled_authors). UNION убирает и дубли, если автор перешёл порог
+    FEED_FANOUT_LIMIT после того, как его рецепты попали в ленты.
+    after — (pub_date, recipe_id) последней строки предыдущей страницы.
+    """
+    entries = FeedEntry.objects.filter(user_id=user_id)
+    pulled = Recipe.objects.filter(
+        author__in=Follow.objects.filter(
+            user_id=user_id,
+            author__stats__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+        ).values("author")
+    ).annotate(recipe_id=F("pk"))
+    if after is not None:
+        pub_date, recipe_id = after
+        older = Q(pub_date__lt=pub_date) | Q(
+            pub_date=pub_date, recipe_id__lt=recipe_id
+        )
+        entries = entries.filter(older)
+        pulled = pulled.filter(older)
+    entries, pulled = (
+        queryset.values_list("pub_date", "recipe_id", named=True)
+        for queryset in (entries, pulled)
+    )
+    if connection.features.supports_slicing_ordering_in_compound:
+        entries = entries.order_by(*ORDERING)[:limit]
+        pulled = pulled.order_by(*ORDERING)[:limit]
+    else:
+        entries, pulled = entries.order_by(), pulled.order_by()
+    return list(entries.union(pulled).order_by(*ORDERING)[:limit])
+
+
+def add_missing(follows):
+    """Добавляет недостающие записи лент по подпискам follows.
+
+    Недостающие записи ищет база (NOT EXISTS по ленте), результат читается
+    потоком и вставляется пачками по BATCH_SIZE. Возвращает их число.
+    """
+    missing = follows.annotate(
+        recipe_id=F("author__recipes__id"),
+        pub_date=F("author__recipes__pub_date"),
+    ).filter(
+        recipe_id__isnull=False
+    ).exclude(
+        Exists(
+            FeedEntry.objects.filter(
+                user=OuterRef("user"), recipe=OuterRef("recipe_id")
+            )
+        )
+    ).values_list(
+        "user_id", "recipe_id", "author_id", "pub_date"
+    ).order_by().iterator(chunk_size=BATCH_SIZE)
+    added = 0
+    while True:
+        rows = list(islice(missing, BATCH_SIZE))
+        if not rows:
+            return added
+        add_entries(rows)
+        added += len(rows)
+
+
+def refill(author_ids):
+    """Раскладывает рецепты авторов, у которых после отписки осталось
+    ровно FEED_FANOUT_LIMIT подписчиков.
+
+    Пока подписчиков было больше, новые рецепты автора не попадали в
+    ленты, а читались при запросе; теперь read_feed их больше не читает.
+    """
+    return add_missing(Follow.objects.filter(
+        author__in=UserStats.objects.filter(
+            user_id__in=author_ids,
+            followers_count=settings.FEED_FANOUT_LIMIT,
+        ).values("user_id")
+    ))
+
+
+def reconcile_feed():
+    """Сверяет ленты с подписками, возвращает число правок."""
+    stale, _ = FeedEntry.objects.exclude(
+        Exists(
+            Follow.objects.filter(
+                user=OuterRef("user"), author=OuterRef("author")
+            )
+        )
+    ).delete()
+    return stale + add_missing(Follow.objects.exclude(
+        author__stats__followers_count__gt=settings.FEED_FANOUT_LIMIT
+    ))
@@ -0,0 +1,63 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image
+
+from .models import Recipe
+from .signals import models_changed
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS, thread_name_prefix="image-variants"
+)
+
+
+def save_variant(field_name, stem, image, format, extension, **params):
+    field = Recipe._meta.get_field(field_name)
+    buffer = BytesIO()
+    image.save(buffer, format, **params)
+    name = field.generate_filename(None, f"{stem}.{extension}")
+    return field.storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def build_variants(recipe_id, name):
+    """Миниатюра и WebP-версия изображения рецепта."""
+    try:
+        storage = Recipe._meta.get_field("image").storage
+        with storage.open(name) as file, Image.open(file) as image:
+            image.load()
+            stem = os.path.splitext(os.path.basename(name))[0]
+            image = image.convert(
+                "RGBA" if "A" in image.getbands() else "RGB"
+            )
+            webp = save_variant(
+                "image_webp", stem, image, "WEBP", "webp", quality=80
+            )
+            image.thumbnail(settings.IMAGE_THUMBNAIL_SIZE)
+            thumbnail = save_variant(
+                "image_thumbnail", stem, image.convert("RGB"), "JPEG", "jpg",
+                quality=85, optimize=True,
+            )
+        updated = Recipe.objects.filter(pk=recipe_id, image=name).update(
+            image_thumbnail=thumbnail, image_webp=webp
+        )
+        if updated:
+            models_changed.send(sender=Recipe)
+    except Exception:
+        logger.exception("Не удалось обработать изображение %s", name)
+    finally:
+        connections.close_all()
+
+
+def schedule_image_variants(recipe):
+    """Ставит обработку изображения в очередь после коммита транзакции."""
+    recipe_id, name = recipe.pk, recipe.image.name
+    transaction.on_commit(
+        lambda: executor.submit(build_variants, recipe_id, name)
+    )
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from users.models import Follow
+
+DELETE_DUPLICATES_SQL = """
+DELETE FROM {follows} WHERE EXISTS (
+    SELECT 1 FROM {follows} AS kept
+    WHERE kept.user_id = {follows}.user_id
+    AND kept.author_id = {follows}.author_id
+    AND kept.id < {follows}.id
+)
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаление повторных подписок, оставляется самая ранняя. "
+        "Запускается перед migrate: ограничение unique_follow не "
+        "создастся, пока в таблице есть повторы"
+    )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        table = Follow._meta.db_table
+        if table not in connection.introspection.table_names():
+            return
+        # Без ORM: сигналы удаления подписки обрезали бы ленту по паре,
+        # у которой остаётся первая подписка.
+        with connection.cursor() as cursor:
+            cursor.execute(DELETE_DUPLICATES_SQL.format(
+                follows=connection.ops.quote_name(table)
+            ))
+            deleted = cursor.rowcount
+        if deleted:
+            self.stdout.write(
+                f"Удалено повторных подписок: {deleted}. Пересчитайте "
+                f"счётчики подписчиков командой reconcile_counters."
+            )
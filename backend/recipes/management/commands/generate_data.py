@@ -0,0 +1,189 @@
+import random
+from datetime import timedelta
+from io import BytesIO
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+from recipes.models import (FavouriteRecipe, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from recipes.search import update_search_vector
+from recipes.signals import models_changed
+from rest_framework.authtoken.models import Token
+from users.models import Follow
+
+User = get_user_model()
+
+TAGS = (
+    ("Завтрак", "#E26C2D", "breakfast"),
+    ("Обед", "#49B64E", "lunch"),
+    ("Ужин", "#8775D2", "dinner"),
+)
+BATCH_SIZE = 2000
+
+
+def zipf_choices(rng, population, count, exponent=1.1):
+    """Выбор с убывающей популярностью: первые элементы встречаются чаще."""
+    weights = [
+        1 / (rank ** exponent) for rank in range(1, len(population) + 1)
+    ]
+    return rng.choices(population, weights=weights, k=count)
+
+
+def batched(objects):
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, BATCH_SIZE))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = "Генерация тестовых данных для нагрузочного тестирования"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--recipes", type=int, default=1000)
+        parser.add_argument("--follows", type=int, default=10,
+                            help="Подписок на пользователя")
+        parser.add_argument("--favourites", type=int, default=20,
+                            help="Рецептов в избранном у пользователя")
+        parser.add_argument("--cart", type=int, default=5,
+                            help="Рецептов в списке покупок у пользователя")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def create_catalog(self, rng):
+        for name, color, slug in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={"name": name, "color": color}
+            )
+        if Ingredient.objects.count() < 50:
+            Ingredient.objects.bulk_create(
+                [
+                    Ingredient(
+                        name=f"ингредиент {index}",
+                        measurement_unit=rng.choice(("г", "мл", "шт")),
+                    )
+                    for index in range(500)
+                ],
+                ignore_conflicts=True,
+            )
+        return (
+            list(Tag.objects.values_list("id", flat=True)),
+            list(Ingredient.objects.values_list("id", flat=True)),
+        )
+
+    def create_users(self, count, prefix):
+        password = make_password("benchmark-password")
+        User.objects.bulk_create(
+            User(
+                username=f"{prefix}{index}",
+                email=f"{prefix}{index}@example.com",
+                first_name="Тест",
+                last_name=f"Пользователь {index}",
+                password=password,
+            )
+            for index in range(count)
+        )
+        users = list(User.objects.filter(username__startswith=prefix))
+        Token.objects.bulk_create(
+            [Token(user=user, key=Token.generate_key()) for user in users]
+        )
+        return [user.id for user in users]
+
+    @staticmethod
+    def create_image():
+        buffer = BytesIO()
+        Image.new("RGB", (600, 400), "#E26C2D").save(buffer, "JPEG")
+        field = Recipe._meta.get_field("image")
+        name = field.generate_filename(None, "benchmark.jpg")
+        return field.storage.save(name, ContentFile(buffer.getvalue()))
+
+    def create_recipes(self, rng, count, user_ids, tag_ids, ingredient_ids):
+        image = self.create_image()
+        now = timezone.now()
+        authors = zipf_choices(rng, user_ids, count)
+        for batch in batched(range(count)):
+            recipes = Recipe.objects.bulk_create([
+                Recipe(
+                    author_id=authors[index],
+                    name=f"Рецепт {index}",
+                    image=image,
+                    text="Описание рецепта " * rng.randint(5, 50),
+                    cooking_time=rng.randint(5, 180),
+                    pub_date=now - timedelta(minutes=index),
+                )
+                for index in batch
+            ])
+            if not recipes or recipes[0].pk is None:
+                recipes = list(
+                    Recipe.objects.filter(image=image).order_by("-id")
+                    [:len(batch)]
+                )
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(
+                    recipe=recipe, ingredient_id=ingredient_id,
+                    amount=rng.randint(1, 500),
+                )
+                for recipe in recipes
+                for ingredient_id in set(zipf_choices(
+                    rng, ingredient_ids, rng.randint(3, 12)
+                ))
+            ])
+            Recipe.tags.through.objects.bulk_create([
+                Recipe.tags.through(recipe=recipe, tag_id=tag_id)
+                for recipe in recipes
+                for tag_id in rng.sample(tag_ids, rng.randint(1, 3))
+            ])
+        update_search_vector(Recipe.objects.filter(image=image))
+        return list(
+            Recipe.objects.filter(image=image).values_list("id", flat=True)
+        )
+
+    @staticmethod
+    def create_relations(rng, model, field, user_ids, targets, per_user):
+        model.objects.bulk_create(
+            (
+                model(user_id=user_id, **{f"{field}_id": target})
+                for user_id in user_ids
+                for target in set(zipf_choices(rng, targets, per_user))
+                if target != user_id or field != "author"
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = f"bench{options['seed']}_{User.objects.count()}_"
+        tag_ids, ingredient_ids = self.create_catalog(rng)
+        user_ids = self.create_users(options["users"], prefix)
+        recipe_ids = self.create_recipes(
+            rng, options["recipes"], user_ids, tag_ids, ingredient_ids
+        )
+        self.create_relations(
+            rng, Follow, "author", user_ids, user_ids, options["follows"]
+        )
+        self.create_relations(
+            rng, FavouriteRecipe, "recipe", user_ids, recipe_ids,
+            options["favourites"],
+        )
+        self.create_relations(
+            rng, ShoppingCart, "recipe", user_ids, recipe_ids,
+            options["cart"],
+        )
+        call_command("reconcile_counters", stdout=self.stdout)
+        for model in (Recipe, RecipeIngredient, Tag, Ingredient, User):
+            models_changed.send(sender=model)
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано пользователей: {len(user_ids)}, "
+            f"рецептов: {len(recipe_ids)}. Префикс логинов: {prefix}"
+        ))
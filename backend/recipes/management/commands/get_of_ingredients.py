@@ -1,32 +1,176 @@
 import csv
+import io
+import json
+import os
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
-from recipes.models import Ingredient
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.models import Ingredient, Tag
+from recipes.signals import models_changed
+
+MODELS = {
+    "ingredients": (Ingredient, ("name", "measurement_unit")),
+    "tags": (Tag, ("name", "color", "slug")),
+}
+UNIQUE_FIELDS = {
+    "ingredients": (("name", "measurement_unit"),),
+    "tags": (("name",), ("slug",)),
+}
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file, fields):
+    for row in csv.reader(file):
+        if row:
+            yield tuple(row[:len(fields)])
+
+
+def read_json(file, fields):
+    """Потоковое чтение JSON-массива или JSON Lines по одному объекту."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    while True:
+        buffer = buffer.lstrip().lstrip("[,").lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(JSON_CHUNK_SIZE)
+            if not chunk:
+                if buffer:
+                    raise CommandError(f"Некорректный JSON: {buffer[:50]}")
+                return
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield tuple(obj[field] for field in fields)
+
+
+READERS = {"csv": read_csv, "json": read_json}
 
 
 class Command(BaseCommand):
-    help = "Загрузка данных из csv файла в модель Ingredient"
+    help = "Пакетная загрузка ингредиентов или тегов из csv/json файла"
 
     def add_arguments(self, parser):
-        parser.add_argument("--path", type=str, help="Путь к файлу")
+        parser.add_argument(
+            "--path",
+            type=str,
+            default="data/",
+            help="Путь к файлу или к папке с ingredients.csv",
+        )
+        parser.add_argument(
+            "--model", choices=MODELS, default="ingredients",
+            help="Какие данные загружаются",
+        )
+        parser.add_argument(
+            "--format", choices=READERS, help="Формат файла"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=5000,
+            help="Количество строк в одной пачке",
+        )
+        parser.add_argument(
+            "--no-copy", action="store_true",
+            help="Не использовать COPY даже на PostgreSQL",
+        )
+
+    def get_path(self, options):
+        path = options["path"]
+        if os.path.isdir(path):
+            path = os.path.join(path, f"{options['model']}.csv")
+        if not os.path.isfile(path):
+            raise CommandError(f"Файл {path} не найден.")
+        return path
+
+    def deduplicate(self, rows, model_name, fields):
+        unique = [
+            tuple(fields.index(field) for field in unique_fields)
+            for unique_fields in UNIQUE_FIELDS[model_name]
+        ]
+        seen = [set() for _ in unique]
+        for row in rows:
+            self.read += 1
+            keys = [
+                tuple(row[index] for index in indexes) for indexes in unique
+            ]
+            if any(key in values for key, values in zip(keys, seen)):
+                continue
+            for key, values in zip(keys, seen):
+                values.add(key)
+            yield row
+
+    @staticmethod
+    def batches(rows, size):
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, size))
+            if not batch:
+                return
+            yield batch
+
+    @staticmethod
+    def load_bulk_create(model, fields, batches):
+        for batch in batches:
+            model.objects.bulk_create(
+                [model(**dict(zip(fields, row))) for row in batch],
+                ignore_conflicts=True,
+            )
+
+    @staticmethod
+    def load_copy(model, fields, batches):
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ", ".join(map(connection.ops.quote_name, fields))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMP TABLE import_rows ON COMMIT DROP AS "
+                f"SELECT {columns} FROM {table} WITH NO DATA"
+            )
+            for batch in batches:
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f"COPY import_rows ({columns}) FROM STDIN "
+                    f"WITH (FORMAT csv)",
+                    buffer,
+                )
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) "
+                f"SELECT {columns} FROM import_rows ON CONFLICT DO NOTHING"
+            )
 
     def handle(self, *args, **options):
-        print("Ожидайте, загружаю...")
-        file_path = options["path"] + "ingredients.csv"
-        with open(file_path, "r") as csv_file:
-            reader = csv.reader(csv_file)
-
-            for row in reader:
-                name_csv = 0
-                unit_of_measurement_csv = 1
-                try:
-                    obj, created = Ingredient.objects.get_or_create(
-                        name=row[name_csv],
-                        unit_of_measurement=row[unit_of_measurement_csv],
-                    )
-                    if not created:
-                        print(f"Ингредиент {obj} уже tcnm в базе данных.")
-                except Exception as err:
-                    print(f"Ошибка в строке {row}: {err}")
-
-        print("Данные успешно загружены в модель. Кто молодец? :)")
+        model_name = options["model"]
+        model, fields = MODELS[model_name]
+        path = self.get_path(options)
+        file_format = options["format"] or os.path.splitext(path)[1][1:]
+        if file_format not in READERS:
+            raise CommandError(f"Неизвестный формат файла: {path}")
+        use_copy = (
+            connection.vendor == "postgresql" and not options["no_copy"]
+        )
+        load = self.load_copy if use_copy else self.load_bulk_create
+
+        self.stdout.write("Ожидайте, загружаю...")
+        self.read = 0
+        started = time.monotonic()
+        count_before = model.objects.count()
+        with open(path, encoding="utf-8") as file, transaction.atomic():
+            rows = self.deduplicate(
+                READERS[file_format](file, fields), model_name, fields
+            )
+            load(model, fields, self.batches(rows, options["batch_size"]))
+        inserted = model.objects.count() - count_before
+        if inserted:
+            models_changed.send(sender=model)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Прочитано строк: {self.read}, добавлено: {inserted}, "
+            f"пропущено: {self.read - inserted}. "
+            f"Скорость: {self.read / max(elapsed, 1e-6):.0f} строк/с "
+            f"({'COPY' if use_copy else 'bulk_create'})."
+        ))
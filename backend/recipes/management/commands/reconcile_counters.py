@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from recipes.cart import reconcile_cart_ingredients
+from recipes.feed import reconcile_feed
+from recipes.models import FavouriteRecipe, Recipe, ShoppingCart
+from recipes.signals import recipe_counter_changed
+from users.models import Follow, UserStats
+
+User = get_user_model()
+
+
+def count_of(model, field, outer="pk"):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef(outer)})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        Value(0),
+    )
+
+
+COUNTERS = (
+    (Recipe, "favourites_count", count_of(FavouriteRecipe, "recipe")),
+    (Recipe, "in_carts_count", count_of(ShoppingCart, "recipe")),
+    (UserStats, "recipes_count", count_of(Recipe, "author", "user")),
+    (UserStats, "followers_count", count_of(Follow, "author", "user")),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчёт денормализованных счётчиков рецептов и пользователей "
+        "и сверка агрегата списков покупок и лент подписок"
+    )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        UserStats.objects.bulk_create(
+            [
+                UserStats(user_id=user_id)
+                for user_id in User.objects.filter(
+                    stats__isnull=True
+                ).values_list("id", flat=True)
+            ],
+            ignore_conflicts=True,
+        )
+        for model, field, actual in COUNTERS:
+            fixed = model.objects.exclude(**{field: actual}).update(
+                **{field: actual}
+            )
+            if fixed and model is Recipe:
+                recipe_counter_changed.send(sender=Recipe, field=field)
+            self.stdout.write(
+                f"{model._meta.verbose_name_plural}.{field}: "
+                f"исправлено записей {fixed}"
+            )
+        self.stdout.write(
+            f"Ингредиенты списков покупок: исправлено записей "
+            f"{reconcile_cart_ingredients()}"
+        )
+        self.stdout.write(
+            f"Ленты подписок: исправлено записей {reconcile_feed()}"
+        )
@@ -1,4 +1,6 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
 from django.utils import timezone
@@ -25,6 +27,16 @@ class Recipe(models.Model):
         upload_to="foodgram_backend/images",
         null=False,
     )
+    image_thumbnail = models.ImageField(
+        verbose_name="Миниатюра изображения",
+        upload_to="foodgram_backend/images/thumbnails",
+        blank=True,
+    )
+    image_webp = models.ImageField(
+        verbose_name="Изображение в формате WebP",
+        upload_to="foodgram_backend/images/webp",
+        blank=True,
+    )
     text = models.TextField(verbose_name="Описание", null=False)
     ingredients = models.ManyToManyField(
         to="Ingredient",
@@ -46,11 +58,40 @@ class Recipe(models.Model):
         verbose_name="Дата публикации",
         default=timezone.now,
     )
+    favourites_count = models.PositiveIntegerField(
+        verbose_name="В избранном",
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name="В списках покупок",
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        verbose_name="Поисковый вектор",
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
-        ordering = ("-pub_date",)
+        ordering = ("-pub_date", "-id")
+        indexes = [
+            models.Index(
+                fields=("-pub_date", "-id"), name="recipe_recent_idx"
+            ),
+            models.Index(
+                fields=("-favourites_count", "-pub_date", "-id"),
+                name="recipe_popular_idx",
+            ),
+            models.Index(
+                fields=("author", "-pub_date", "-id"),
+                name="recipe_author_recent_idx",
+            ),
+            GinIndex(fields=("search_vector",), name="recipe_search_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -201,3 +242,84 @@ class ShoppingCart(models.Model):
     def __str__(self):
         return (f"{self.user.username} добавил "
                 f"{self.recipe.name} в список покупок.")
+
+
+class ShoppingCartIngredient(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="shopping_cart_ingredients",
+        verbose_name="Пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="shopping_cart_totals",
+        verbose_name="Ингредиент",
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name="Количество", default=0
+    )
+
+    class Meta:
+        verbose_name = "Ингредиент списка покупок"
+        verbose_name_plural = "Ингредиенты списков покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "ingredient"], name="unique_cart_ingredient"
+            )
+        ]
+
+    def __str__(self):
+        return (f"{self.ingredient.name} {self.total_amount} "
+                f"{self.ingredient.measurement_unit} "
+                f"у {self.user.username}")
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписчика автора.
+
+    Автор и дата публикации скопированы из рецепта, чтобы страница ленты
+    читалась по одному индексу, а отписка удаляла записи без JOIN.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="feed",
+        verbose_name="Подписчик",
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="feed_entries",
+        verbose_name="Рецепт",
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Автор рецепта",
+    )
+    pub_date = models.DateTimeField(verbose_name="Дата публикации")
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи лент"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"], name="unique_feed_entry"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=("user", "-pub_date", "-recipe"),
+                name="feed_user_recent_idx",
+            ),
+            models.Index(
+                fields=("user", "author"), name="feed_user_author_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe.name} в ленте {self.user.username}"
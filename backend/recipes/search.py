@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, TrigramSimilarity)
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.db.models import F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Recipe, RecipeIngredient
+
+TRIGRAM_INDEX = "recipe_name_trgm_idx"
+
+
+def is_postgresql():
+    return connection.vendor == "postgresql"
+
+
+def ingredient_names():
+    return Coalesce(
+        Subquery(
+            RecipeIngredient.objects.filter(recipe=OuterRef("pk"))
+            .values("recipe")
+            .annotate(names=StringAgg("ingredient__name", " "))
+            .values("names")
+        ),
+        Value(""),
+    )
+
+
+def recipe_search_vector():
+    config = settings.SEARCH_CONFIG
+    return (
+        SearchVector("name", weight="A", config=config)
+        + SearchVector(ingredient_names(), weight="B", config=config)
+        + SearchVector("text", weight="C", config=config)
+    )
+
+
+def update_search_vector(recipes):
+    """Пересчёт search_vector для queryset рецептов одним UPDATE."""
+    if is_postgresql():
+        recipes.update(search_vector=recipe_search_vector())
+
+
+def search_recipes(queryset, query):
+    """Полнотекстовый поиск с ранжированием.
+
+    К совпадениям по search_vector добавляются рецепты с похожим названием
+    (pg_trgm), чтобы находить запросы с опечатками. На других СУБД
+    остаётся поиск подстроки без ранжирования.
+    """
+    if not is_postgresql():
+        return queryset.filter(
+            Q(name__icontains=query)
+            | Q(text__icontains=query)
+            | Q(pk__in=RecipeIngredient.objects.filter(
+                ingredient__name__icontains=query
+            ).values("recipe_id"))
+        )
+    search_query = SearchQuery(
+        query, config=settings.SEARCH_CONFIG, search_type="websearch"
+    )
+    return (
+        queryset.filter(
+            Q(search_vector=search_query) | Q(name__trigram_similar=query)
+        )
+        .annotate(
+            search_rank=SearchRank(F("search_vector"), search_query)
+            + TrigramSimilarity("name", query)
+        )
+        .order_by("-search_rank", "-pub_date", "-id")
+    )
+
+
+def prepare_search(using, **kwargs):
+    """После миграций: pg_trgm, триграммный индекс и заполнение вектора."""
+    if using != DEFAULT_DB_ALIAS or not is_postgresql():
+        return
+    table = connection.ops.quote_name(Recipe._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} "
+            f"ON {table} USING gin (name gin_trgm_ops)"
+        )
+    update_search_vector(Recipe.objects.filter(search_vector__isnull=True))
@@ -0,0 +1,45 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from users.models import Follow
+
+from .feed import backfill, fan_out, trim
+from .models import Ingredient, Recipe
+from .search import update_search_vector
+
+# Отправляется после записи ингредиентов рецепта: bulk_create и clear()
+# не дают сигналов по отдельным строкам.
+recipe_ingredients_changed = Signal()
+# Отправляется после изменения счётчика рецептов (аргумент field): счётчики
+# меняются запросами UPDATE и raw SQL, без сигналов модели.
+recipe_counter_changed = Signal()
+# Отправляется после массовой записи в обход сигналов модели (загрузка
+# справочников, генерация данных, варианты изображений), sender - модель.
+models_changed = Signal()
+
+
+@receiver(recipe_ingredients_changed)
+def refresh_recipe_search_vector(sender, recipe, **kwargs):
+    update_search_vector(Recipe.objects.filter(pk=recipe.pk))
+
+
+@receiver(post_save, sender=Ingredient)
+def refresh_ingredient_recipes(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vector(Recipe.objects.filter(ingredients=instance))
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_feed(sender, instance, **kwargs):
+    trim(instance.user_id, instance.author_id)
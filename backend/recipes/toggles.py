@@ -0,0 +1,227 @@
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from users.models import Follow
+
+from .counters import (RECIPE_COUNTERS, change_recipe_counter,
+                       change_users_counter, send_counter_changed)
+from .feed import backfill, refill, trim
+from .models import Recipe
+from .search import is_postgresql
+
+User = get_user_model()
+
+RECIPE_FIELDS = ("id", "name", "image", "image_thumbnail", "image_webp",
+                 "cooking_time")
+
+ADD_RECIPES_SQL = """
+WITH recipe AS (
+    SELECT {columns} FROM {recipes} WHERE id = ANY(%s)
+), inserted AS (
+    INSERT INTO {table} (user_id, recipe_id{stamps})
+    SELECT %s, id{stamp_values} FROM recipe
+    ON CONFLICT DO NOTHING
+    RETURNING recipe_id
+), counted AS (
+    UPDATE {recipes} SET {counter} = {counter} + 1
+    WHERE id IN (SELECT recipe_id FROM inserted)
+)
+SELECT {columns}, id IN (SELECT recipe_id FROM inserted) FROM recipe
+"""
+
+REMOVE_RECIPES_SQL = """
+WITH deleted AS (
+    DELETE FROM {table} WHERE user_id = %s AND recipe_id = ANY(%s)
+    RETURNING recipe_id
+), counted AS (
+    UPDATE {recipes} SET {counter} = GREATEST({counter} - 1, 0)
+    WHERE id IN (SELECT recipe_id FROM deleted)
+)
+SELECT recipe_id FROM deleted
+"""
+
+ADD_FOLLOWS_SQL = """
+WITH author AS (
+    SELECT id FROM {users} WHERE id = ANY(%s)
+), inserted AS (
+    INSERT INTO {follows} (user_id, author_id)
+    SELECT %s, id FROM author
+    ON CONFLICT DO NOTHING
+    RETURNING author_id
+)
+SELECT id, id IN (SELECT author_id FROM inserted) FROM author
+"""
+
+REMOVE_FOLLOWS_SQL = """
+DELETE FROM {follows} WHERE user_id = %s AND author_id = ANY(%s)
+RETURNING author_id
+"""
+
+
+def stamp_columns(model):
+    """Столбцы auto_now и auto_now_add: в raw INSERT их заполняет now()."""
+    return [
+        field.column
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False)
+        or getattr(field, "auto_now_add", False)
+    ]
+
+
+def format_sql(sql, model=None):
+    quote = connection.ops.quote_name
+    stamps = stamp_columns(model) if model else []
+    return sql.format(
+        stamps="".join(f", {quote(column)}" for column in stamps),
+        stamp_values=", now()" * len(stamps),
+        columns=", ".join(map(quote, RECIPE_FIELDS)),
+        recipes=quote(Recipe._meta.db_table),
+        users=quote(User._meta.db_table),
+        follows=quote(Follow._meta.db_table),
+        table=model and quote(model._meta.db_table),
+        counter=model and quote(RECIPE_COUNTERS[model]),
+    )
+
+
+def fetch(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def insert_once(model, **values):
+    """Вставляет строку без сигналов, если её ещё нет (не PostgreSQL).
+
+    Вставка идёт в точке сохранения, нарушение уникальности перехватывается,
+    поэтому из параллельных запросов строку добавит ровно один. Возвращает
+    True, если строка добавлена.
+    """
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create([model(**values)])
+    except IntegrityError:
+        return False
+    return True
+
+
+def add_recipes(model, user_id, recipe_ids):
+    """Добавляет рецепты в избранное или корзину и увеличивает счётчики.
+
+    Возвращает ({id: рецепт} для существующих рецептов, id добавленных).
+    На PostgreSQL это один запрос: INSERT ... ON CONFLICT DO NOTHING
+    RETURNING, поэтому из параллельных запросов рецепт добавит ровно один.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return {}, set()
+    if not is_postgresql():
+        recipes = Recipe.objects.only(*RECIPE_FIELDS).in_bulk(recipe_ids)
+        added = {
+            pk for pk in recipes
+            if insert_once(model, user_id=user_id, recipe_id=pk)
+        }
+        change_recipe_counter(model, added, 1)
+        return recipes, added
+    recipes = {}
+    added = set()
+    for *values, inserted in fetch(
+        format_sql(ADD_RECIPES_SQL, model), (recipe_ids, user_id)
+    ):
+        recipe = Recipe.from_db(connection.alias, RECIPE_FIELDS, values)
+        recipes[recipe.pk] = recipe
+        if inserted:
+            added.add(recipe.pk)
+    if added:
+        send_counter_changed(model)
+    return recipes, added
+
+
+def add_recipe(model, user_id, recipe_id):
+    """Возвращает (рецепт, добавлен ли); рецепт None, если его нет."""
+    recipes, added = add_recipes(model, user_id, (int(recipe_id),))
+    return recipes.get(int(recipe_id)), bool(added)
+
+
+def remove_recipes(model, user_id, recipe_ids):
+    """Убирает рецепты из избранного или корзины, возвращает id убранных."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return set()
+    if not is_postgresql():
+        relations = model.objects.filter(
+            user_id=user_id, recipe_id__in=recipe_ids
+        )
+        removed = set(relations.values_list("recipe_id", flat=True))
+        relations.delete()
+        change_recipe_counter(model, removed, -1)
+        return removed
+    removed = {
+        recipe_id
+        for recipe_id, in fetch(
+            format_sql(REMOVE_RECIPES_SQL, model), (user_id, recipe_ids)
+        )
+    }
+    if removed:
+        send_counter_changed(model)
+    return removed
+
+
+def remove_recipe(model, user_id, recipe_id):
+    """Убирает рецепт из избранного или корзины, возвращает число строк."""
+    return len(remove_recipes(model, user_id, (int(recipe_id),)))
+
+
+def add_follows(user_id, author_ids):
+    """Подписывает на авторов, обновляет счётчики подписчиков и ленту.
+
+    Возвращает (id существующих авторов, id новых подписок). Сигналы
+    модели не отправляются: счётчики и лента обновляются сразу для всех
+    новых подписок.
+    """
+    author_ids = list(author_ids)
+    if not author_ids:
+        return set(), set()
+    if not is_postgresql():
+        authors = set(User.objects.filter(pk__in=author_ids).values_list(
+            "pk", flat=True
+        ))
+        added = {
+            pk for pk in authors
+            if insert_once(Follow, user_id=user_id, author_id=pk)
+        }
+    else:
+        rows = fetch(format_sql(ADD_FOLLOWS_SQL), (author_ids, user_id))
+        authors = {author_id for author_id, _ in rows}
+        added = {author_id for author_id, inserted in rows if inserted}
+    if added:
+        change_users_counter(added, "followers_count", 1)
+        backfill(user_id, *added)
+    return authors, added
+
+
+def remove_follows(user_id, author_ids):
+    """Отписывает от авторов, обновляет счётчики подписчиков и ленту.
+
+    Возвращает id авторов, от которых пользователь отписался.
+    """
+    author_ids = list(author_ids)
+    if not author_ids:
+        return set()
+    if not is_postgresql():
+        follows = Follow.objects.filter(
+            user_id=user_id, author_id__in=author_ids
+        )
+        removed = set(follows.values_list("author_id", flat=True))
+        follows.delete()
+    else:
+        removed = {
+            author_id
+            for author_id, in fetch(
+                format_sql(REMOVE_FOLLOWS_SQL), (user_id, author_ids)
+            )
+        }
+        if removed:
+            trim(user_id, *removed)
+    change_users_counter(removed, "followers_count", -1)
+    if removed:
+        refill(removed)
+    return removed
@@ -0,0 +1,63 @@
+import pytest
+from django.core.cache import cache
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def user(django_user_model):
+    return django_user_model.objects.create_user(
+        username="user", email="user@example.com", password="password",
+        first_name="Имя", last_name="Фамилия",
+    )
+
+
+@pytest.fixture
+def author(django_user_model):
+    return django_user_model.objects.create_user(
+        username="author", email="author@example.com", password="password",
+        first_name="Автор", last_name="Рецептов",
+    )
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    return client
+
+
+@pytest.fixture
+def recipes(author):
+    tags = [
+        Tag.objects.create(name=f"Тег {index}", color=f"#00000{index}",
+                           slug=f"tag{index}")
+        for index in range(2)
+    ]
+    ingredients = [
+        Ingredient.objects.create(name=f"ингредиент {index}",
+                                  measurement_unit="г")
+        for index in range(3)
+    ]
+    recipes = []
+    for index in range(3):
+        recipe = Recipe.objects.create(
+            author=author, name=f"Рецепт {index}", text="Описание",
+            image=f"recipes/images/{index}.png", cooking_time=10 + index,
+        )
+        recipe.tags.set(tags[:index + 1])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient=ingredient, amount=5 + index
+            )
+            for ingredient in ingredients[index:]
+        )
+        recipes.append(recipe)
+    return recipes
@@ -0,0 +1,76 @@
+import pytest
+from recipes.models import FavouriteRecipe, Recipe, ShoppingCart
+from recipes.toggles import add_follows, add_recipes
+from users.models import Follow, UserStats
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+BULK = (
+    ("favorite", FavouriteRecipe, "favourites_count"),
+    ("shopping_cart", ShoppingCart, "in_carts_count"),
+)
+
+
+def statuses(response):
+    return {row["id"]: row["status"] for row in response.json()["results"]}
+
+
+@pytest.mark.parametrize("action, model, counter", BULK)
+def test_bulk_add_remove(user_client, user, recipes, action, model, counter):
+    url = f"/api/recipes/{action}/bulk/"
+    first, second = recipes[0].id, recipes[1].id
+    missing = 10 ** 6
+
+    response = user_client.post(url, {"ids": [first]}, format="json")
+    assert statuses(response) == {first: 201}
+
+    response = user_client.post(
+        url, {"ids": [first, second, missing]}, format="json"
+    )
+    assert statuses(response) == {first: 400, second: 201, missing: 404}
+    assert model.objects.filter(user=user).count() == 2
+    assert [
+        getattr(recipe, counter)
+        for recipe in Recipe.objects.filter(pk__in=(first, second))
+    ] == [1, 1]
+
+    response = user_client.delete(
+        url, {"ids": [first, second]}, format="json"
+    )
+    assert statuses(response) == {first: 204, second: 204}
+    assert not model.objects.filter(user=user).exists()
+    assert set(Recipe.objects.filter(
+        pk__in=(first, second)
+    ).values_list(counter, flat=True)) == {0}
+
+
+@pytest.mark.parametrize("action, model, counter", BULK)
+def test_add_recipes_counts_only_inserted(user, recipes, action, model,
+                                          counter):
+    first, second = recipes[0].id, recipes[1].id
+    # Строку уже вставил параллельный запрос.
+    model.objects.create(user=user, recipe_id=first)
+
+    found, added = add_recipes(model, user.id, (first, second))
+
+    assert set(found) == {first, second}
+    assert added == {second}
+    assert getattr(Recipe.objects.get(pk=second), counter) == 1
+    assert getattr(Recipe.objects.get(pk=first), counter) == 0
+
+
+def test_add_follows_counts_only_inserted(user, author, django_user_model):
+    other = django_user_model.objects.create_user(
+        username="other", email="other@example.com", password="password"
+    )
+    Follow.objects.create(user=user, author=author)
+    UserStats.objects.update_or_create(
+        user=author, defaults={"followers_count": 1}
+    )
+
+    found, added = add_follows(user.id, (author.id, other.id))
+
+    assert found == {author.id, other.id}
+    assert added == {other.id}
+    assert UserStats.objects.get(user=author).followers_count == 1
+    assert UserStats.objects.get(user=other).followers_count == 1
@@ -0,0 +1,94 @@
+import pytest
+from api.cache import generation_name, get_generation
+from django.db import transaction
+from recipes.models import Recipe
+from recipes.signals import models_changed
+from rest_framework.test import APIClient
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def ids(response):
+    return [recipe["id"] for recipe in response.json()["results"]]
+
+
+def test_popular_page_follows_favourites(user_client, recipes):
+    anonymous = APIClient()
+    url = "/api/recipes/?ordering=popular"
+    before = anonymous.get(url)
+    oldest = recipes[0].id
+    assert ids(before)[-1] == oldest
+
+    user_client.post(f"/api/recipes/{oldest}/favorite/")
+
+    after = anonymous.get(url)
+    assert ids(after)[0] == oldest
+    assert after["ETag"] != before["ETag"]
+
+
+def edit_recipe(recipe):
+    recipe.name = "Новое название"
+    recipe.save()
+
+
+def edit_tag(recipe):
+    tag = recipe.tags.first()
+    tag.name = "Новое название"
+    tag.save()
+
+
+def edit_author(recipe):
+    recipe.author.first_name = "Новое название"
+    recipe.author.save()
+
+
+@pytest.mark.parametrize("edit", (edit_recipe, edit_tag, edit_author))
+@pytest.mark.parametrize("detail", (False, True))
+def test_cached_page_invalidated_after_commit(recipes, edit, detail):
+    anonymous = APIClient()
+    recipe = recipes[0]
+    url = f"/api/recipes/{recipe.id}/" if detail else "/api/recipes/"
+    before = anonymous.get(url)
+    assert anonymous.get(url).content == before.content
+
+    with transaction.atomic():
+        edit(recipe)
+
+    after = anonymous.get(url)
+    assert "Новое название" not in before.content.decode()
+    assert "Новое название" in after.content.decode()
+    assert after["ETag"] != before["ETag"]
+
+
+def test_generation_bumped_on_commit(recipes):
+    name = generation_name(Recipe)
+    generation = get_generation(name)
+    with transaction.atomic():
+        edit_recipe(recipes[0])
+        # До фиксации другой запрос ещё читает старые строки.
+        assert get_generation(name) == generation
+    assert get_generation(name) != generation
+
+
+def test_not_modified_round_trip(recipes):
+    anonymous = APIClient()
+    url = "/api/recipes/"
+    etag = anonymous.get(url)["ETag"]
+
+    response = anonymous.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert response["ETag"] == etag
+    assert not response.content
+
+    edit_recipe(recipes[0])
+
+    response = anonymous.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+
+def test_bulk_write_signal_bumps_generation(recipes):
+    name = generation_name(Recipe)
+    generation = get_generation(name)
+    models_changed.send(sender=Recipe)
+    assert get_generation(name) != generation
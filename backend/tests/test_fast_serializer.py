@@ -0,0 +1,48 @@
+import pytest
+from django.core.cache import cache
+from django.test import override_settings
+from recipes.models import FavouriteRecipe, ShoppingCart
+from rest_framework.test import APIClient
+from users.models import Follow
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture
+def relations(user, author, recipes):
+    FavouriteRecipe.objects.create(user=user, recipe=recipes[0])
+    ShoppingCart.objects.create(user=user, recipe=recipes[1])
+    Follow.objects.create(user=user, author=author)
+
+
+def urls(recipes):
+    ingredients = ",".join(
+        str(item.ingredient_id)
+        for item in recipes[0].recipe_ingredients.all()
+    )
+    return (
+        "/api/recipes/",
+        "/api/recipes/?limit=2&page=2",
+        f"/api/recipes/{recipes[0].id}/",
+        "/api/recipes/feed/",
+        f"/api/recipes/match/?ingredients={ingredients}",
+    )
+
+
+def render(client, url, fast):
+    # Анонимные ответы кэшируются без учёта настройки.
+    cache.clear()
+    with override_settings(RECIPE_FAST_SERIALIZER=fast):
+        response = client.get(url)
+    return response.status_code, response.content
+
+
+@pytest.mark.parametrize("logged_in", (False, True))
+def test_fast_serializer_renders_same_bytes(user_client, recipes, relations,
+                                            logged_in):
+    client = user_client if logged_in else APIClient()
+    for url in urls(recipes):
+        status_code, content = render(client, url, fast=False)
+        if logged_in:
+            assert status_code == 200, (url, content)
+        assert render(client, url, fast=True) == (status_code, content), url
@@ -0,0 +1,42 @@
+import pytest
+from recipes.models import FeedEntry, Recipe
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def feed_ids(client):
+    response = client.get("/api/recipes/feed/")
+    assert response.status_code == 200
+    return [recipe["id"] for recipe in response.json()["results"]]
+
+
+def test_recipes_published_while_pulled_stay_in_feed(
+    settings, user, user_client, author, django_user_model
+):
+    settings.FEED_FANOUT_LIMIT = 1
+    other = django_user_model.objects.create_user(
+        username="other", email="other@example.com", password="password"
+    )
+    other_client = APIClient()
+    other_client.credentials(
+        HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=other).key}"
+    )
+    subscribe = f"/api/users/{author.id}/subscribe/"
+    assert user_client.post(subscribe).status_code == 201
+    assert other_client.post(subscribe).status_code == 201
+
+    # У автора больше FEED_FANOUT_LIMIT подписчиков: рецепт не
+    # раскладывается по лентам, а читается при запросе ленты.
+    recipe = Recipe.objects.create(
+        author=author, name="Рецепт", text="Описание",
+        image="recipes/images/new.png", cooking_time=10,
+    )
+    assert not FeedEntry.objects.filter(recipe=recipe).exists()
+    assert feed_ids(user_client) == [recipe.id]
+
+    assert other_client.delete(subscribe).status_code == 204
+
+    assert FeedEntry.objects.filter(user=user, recipe=recipe).exists()
+    assert feed_ids(user_client) == [recipe.id]
@@ -0,0 +1,114 @@
+import pytest
+from api.catalog import ingredient_catalog, tag_catalog
+from api.queries import QueryBudgetExceeded, assert_max_queries
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from recipes.models import FavouriteRecipe, Recipe, RecipeIngredient
+from rest_framework.test import APIClient
+from users.models import Follow
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture
+def follows(user, author, recipes):
+    Follow.objects.create(user=user, author=author)
+
+
+@pytest.fixture
+def warm_catalog(recipes):
+    # Справочники тегов и ингредиентов загружаются в память процесса при
+    # первом запросе, бюджеты считаются для последующих.
+    tag_catalog.refresh()
+    ingredient_catalog.refresh()
+
+
+@pytest.mark.parametrize("logged_in", (False, True))
+def test_recipe_list_within_budget(user_client, warm_catalog, logged_in):
+    client = user_client if logged_in else APIClient()
+    with assert_max_queries(
+        settings.QUERY_BUDGETS["RecipeViewSet.list"], allow_duplicates=False
+    ):
+        response = client.get("/api/recipes/")
+    assert response.status_code == 200
+
+
+def test_subscriptions_within_budget(user_client, follows, warm_catalog):
+    with assert_max_queries(
+        settings.QUERY_BUDGETS["CustomUserViewSet.subscriptions"],
+        allow_duplicates=False,
+    ):
+        response = user_client.get("/api/users/subscriptions/")
+    assert response.status_code == 200
+    assert response.json()["results"]
+
+
+def test_over_budget_raises(recipes):
+    with pytest.raises(QueryBudgetExceeded):
+        with assert_max_queries(1):
+            Recipe.objects.count()
+            Recipe.objects.first()
+
+
+def test_duplicate_query_raises(recipes):
+    with assert_max_queries(2):
+        Recipe.objects.get(pk=recipes[0].pk)
+        Recipe.objects.get(pk=recipes[1].pk)
+    with pytest.raises(QueryBudgetExceeded):
+        with assert_max_queries(2, allow_duplicates=False):
+            Recipe.objects.get(pk=recipes[0].pk)
+            Recipe.objects.get(pk=recipes[1].pk)
+
+
+def test_strict_budget_fails_request(recipes):
+    with override_settings(
+        QUERY_INSTRUMENTATION=True,
+        QUERY_BUDGET_STRICT=True,
+        QUERY_BUDGETS={"RecipeViewSet.list": 0},
+    ):
+        with pytest.raises(QueryBudgetExceeded):
+            APIClient().get("/api/recipes/")
+
+
+@pytest.fixture
+def many_recipes(user, recipes, django_user_model):
+    source = recipes[-1]
+    for index in range(20):
+        author = django_user_model.objects.create_user(
+            username=f"author{index}", email=f"author{index}@example.com",
+            password="password",
+        )
+        recipe = Recipe.objects.create(
+            author=author, name=f"Ещё рецепт {index}", text="Описание",
+            image=f"recipes/images/more{index}.png", cooking_time=5,
+        )
+        recipe.tags.set(source.tags.all())
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=item.ingredient_id, amount=1
+            )
+            for item in source.recipe_ingredients.all()
+        )
+        if index % 2:
+            FavouriteRecipe.objects.create(user=user, recipe=recipe)
+            Follow.objects.create(user=user, author=author)
+
+
+@pytest.mark.parametrize("fast", (False, True))
+@pytest.mark.parametrize("logged_in", (False, True))
+def test_recipe_list_queries_do_not_depend_on_limit(
+    settings, user_client, many_recipes, warm_catalog, logged_in, fast
+):
+    settings.RECIPE_FAST_SERIALIZER = fast
+    client = user_client if logged_in else APIClient()
+    # Первый запрос кладёт токен в кэш проверенных токенов.
+    client.get("/api/recipes/?limit=2")
+    counts = []
+    for limit in (1, 20):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(f"/api/recipes/?limit={limit}")
+        assert len(response.json()["results"]) == min(limit, 15)
+        counts.append(len(queries))
+    assert counts[0] == counts[1]
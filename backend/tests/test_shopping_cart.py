@@ -0,0 +1,33 @@
+import pytest
+from recipes.models import ShoppingCart
+from rest_framework.test import APIClient
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+URL = "/api/recipes/download_shopping_cart/"
+
+
+@pytest.fixture
+def cart(user, recipes):
+    ShoppingCart.objects.create(user=user, recipe=recipes[0])
+
+
+@pytest.mark.parametrize("query, accept, content_type", (
+    ("", "*/*", "application/pdf"),
+    ("", "application/json", "application/pdf"),
+    ("?format=txt", "*/*", "text/plain; charset=utf-8"),
+    ("?format=csv", "*/*", "text/csv; charset=utf-8"),
+))
+def test_download_formats(user_client, cart, query, accept, content_type):
+    response = user_client.get(URL + query, HTTP_ACCEPT=accept)
+    assert response.status_code == 200
+    assert response["Content-Type"] == content_type
+    assert b"".join(response.streaming_content)
+
+
+@pytest.mark.parametrize("query", ("", "?format=csv"))
+def test_errors_rendered_as_json(query):
+    response = APIClient().get(URL + query)
+    assert response.status_code == 401
+    assert response["Content-Type"] == "application/json"
+    assert "detail" in response.json()
@@ -0,0 +1,46 @@
+import pytest
+from recipes.models import FavouriteRecipe, Recipe, ShoppingCart
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+TOGGLES = (
+    ("favorite", FavouriteRecipe, "favourites_count"),
+    ("shopping_cart", ShoppingCart, "in_carts_count"),
+)
+
+
+@pytest.mark.parametrize("action, model, counter", TOGGLES)
+def test_add_readd_remove(user_client, user, recipes, action, model,
+                          counter):
+    recipe = recipes[0]
+    url = f"/api/recipes/{recipe.id}/{action}/"
+
+    response = user_client.post(url)
+    assert response.status_code == 201, response.content
+    assert response.json()["id"] == recipe.id
+    relation = model.objects.get(user=user, recipe=recipe)
+    if model is FavouriteRecipe:
+        assert relation.date_added is not None
+    assert getattr(Recipe.objects.get(pk=recipe.pk), counter) == 1
+
+    response = user_client.post(url)
+    assert response.status_code == 400
+    assert "errors" in response.json()
+    assert model.objects.filter(user=user, recipe=recipe).count() == 1
+    assert getattr(Recipe.objects.get(pk=recipe.pk), counter) == 1
+
+    response = user_client.delete(url)
+    assert response.status_code == 204
+    assert not model.objects.filter(user=user, recipe=recipe).exists()
+    assert getattr(Recipe.objects.get(pk=recipe.pk), counter) == 0
+
+    response = user_client.delete(url)
+    assert response.status_code == 400
+    assert getattr(Recipe.objects.get(pk=recipe.pk), counter) == 0
+
+
+@pytest.mark.parametrize("action, model, counter", TOGGLES)
+def test_add_missing_recipe(user_client, recipes, action, model, counter):
+    response = user_client.post(f"/api/recipes/0/{action}/")
+    assert response.status_code == 400
+    assert not model.objects.exists()
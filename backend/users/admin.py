@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.models import User
 
-from .models import Follow
+from .models import Follow, UserStats
 
 
 class UserAdmin(admin.ModelAdmin):
@@ -15,5 +15,13 @@ class FollowAdmin(admin.ModelAdmin):
     empty_value_display = "Нет записей"
 
 
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ("user", "recipes_count", "followers_count")
+    list_select_related = ("user",)
+    search_fields = ("user__username",)
+    empty_value_display = "Нет записей"
+
+
 admin.site.unregister(User)
 admin.site.register(User, UserAdmin)
@@ -22,6 +22,34 @@ class Follow(models.Model):
         ordering = ("-pk",)
         verbose_name = "Подписка"
         verbose_name_plural = "Подписки"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "author"], name="unique_follow"
+            )
+        ]
 
     def __str__(self):
         return f"{self.user.username} подписан на {self.author.username}"
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        verbose_name="Пользователь",
+        related_name="stats",
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name="Рецептов", default=0
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name="Подписчиков", default=0
+    )
+
+    class Meta:
+        verbose_name = "Счётчики пользователя"
+        verbose_name_plural = "Счётчики пользователей"
+
+    def __str__(self):
+        return f"Счётчики {self.user.username}"